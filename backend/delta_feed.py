@@ -0,0 +1,204 @@
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+
+# --- CONFIGURAZIONE ---
+REPO_LOCAL_PATH = "GloboNews_repo"
+FEED_DIR = os.path.join(REPO_LOCAL_PATH, "public", "feed")
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+FEED_WINDOW_HOURS = 48   # Stessa finestra mostrata dal frontend
+CHECKPOINT_EVERY = 12    # Delta tra due checkpoint (un giorno con un ciclo ogni 2 ore)
+DELTA_RETENTION = 24     # Delta mantenuti dopo la compattazione per i client rimasti indietro
+CHECKPOINT_KEEP = 3      # Checkpoint pubblicati: la CDN può servire per qualche minuto uno state.json precedente
+
+# Struttura di public/feed (percorsi relativi a public/, come nel manifest):
+#   state.json              seq corrente, checkpoint e primo delta disponibile
+#   checkpoint_<seq>.json   tutte le notizie della finestra al seq indicato
+#   checkpoints.json        checkpoint ancora pubblicati, dal più recente
+#   deltas/<seq>.json       notizie aggiunte e id rimossi rispetto a seq - 1
+#   changelog.jsonl         storico di tutti i seq con i soli id
+
+
+def item_id(item):
+    """Identificativo stabile di una notizia, derivato dal link."""
+    return hashlib.sha1(item['link'].encode('utf-8')).hexdigest()[:12]
+
+
+def parse_item_time(item):
+    try:
+        return datetime.strptime(item.get('timestamp', ''), TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def read_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json(path, data):
+    """Scrive JSON compatto passando da un file temporaneo, per non esporre file a metà."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def load_state(feed_dir=FEED_DIR):
+    return read_json(os.path.join(feed_dir, "state.json"))
+
+
+def load_window_from_manifest(public_dir, threshold):
+    """Notizie della finestra lette dal manifest: il punto di partenza del primo checkpoint."""
+    items = {}
+    for news_file in read_json(os.path.join(public_dir, "news_manifest.json"), []):
+        try:
+            news_items = read_json(os.path.join(public_dir, news_file), [])
+        except json.JSONDecodeError:
+            continue
+        for item in news_items:
+            timestamp = parse_item_time(item)
+            if item.get('link') and timestamp and timestamp > threshold:
+                items[item_id(item)] = {**item, "id": item_id(item)}
+    return items
+
+
+def load_current_items(feed_dir, state):
+    """Ricostruisce la finestra corrente dall'ultimo checkpoint e dai delta successivi, come fa il client."""
+    public_dir = os.path.dirname(feed_dir)
+    checkpoint = read_json(os.path.join(public_dir, state['checkpoint_file']), {"items": []})
+    items = {item['id']: item for item in checkpoint['items']}
+    for seq in range(state['checkpoint'] + 1, state['seq'] + 1):
+        delta = read_json(os.path.join(feed_dir, "deltas", f"{seq}.json"))
+        if delta is None:
+            raise FileNotFoundError(f"Delta {seq} mancante in '{feed_dir}'")
+        for removed_id in delta['removed']:
+            items.pop(removed_id, None)
+        for item in delta['added']:
+            items[item['id']] = item
+    return items
+
+
+def compact_feed(feed_dir, state, items, now):
+    """
+    Scrive un checkpoint con la finestra corrente, elimina i checkpoint oltre CHECKPOINT_KEEP e
+    i delta oltre DELTA_RETENTION che non servono ai checkpoint rimasti. Aggiorna state senza salvarlo.
+    """
+    public_dir = os.path.dirname(feed_dir)
+    seq = state['seq']
+    checkpoint_file = f"checkpoint_{seq}.json"
+    write_json(os.path.join(feed_dir, checkpoint_file), {
+        "seq": seq,
+        "timestamp": now.strftime(TIMESTAMP_FORMAT),
+        "items": sorted(items.values(), key=lambda item: item.get('timestamp', ''), reverse=True),
+    })
+    history_file = os.path.join(feed_dir, "checkpoints.json")
+    history = [checkpoint_file] + [name for name in read_json(history_file, []) if name != checkpoint_file]
+    kept = history[:CHECKPOINT_KEEP]
+    for filename in os.listdir(feed_dir):
+        if filename.startswith("checkpoint_") and filename.endswith(".json") and filename not in kept:
+            os.remove(os.path.join(feed_dir, filename))
+    write_json(history_file, kept)
+
+    # Un client con uno state.json precedente parte da un checkpoint più vecchio: i suoi delta restano
+    oldest_checkpoint = min(int(name[len("checkpoint_"):-len(".json")]) for name in kept)
+    oldest_delta = max(1, min(seq - DELTA_RETENTION, oldest_checkpoint) + 1)
+    deltas_dir = os.path.join(feed_dir, "deltas")
+    if os.path.isdir(deltas_dir):
+        for filename in os.listdir(deltas_dir):
+            if filename.endswith(".json") and int(filename[:-5]) < oldest_delta:
+                os.remove(os.path.join(deltas_dir, filename))
+
+    state.update({
+        "checkpoint": seq,
+        "checkpoint_file": os.path.relpath(os.path.join(feed_dir, checkpoint_file), public_dir).replace(os.sep, "/"),
+        "oldest_delta": oldest_delta,
+    })
+    print(f"Feed compattato nel checkpoint {seq} con {len(items)} notizie.")
+
+
+def publish_delta(news_items, snapshot=None, feed_dir=FEED_DIR, now=None):
+    """
+    Registra nel feed le notizie di uno snapshot appena pubblicato e quelle uscite dalla
+    finestra. Crea un nuovo seq solo se qualcosa è cambiato. Restituisce lo stato del feed.
+    """
+    now = now or datetime.utcnow().replace(microsecond=0)
+    threshold = now - timedelta(hours=FEED_WINDOW_HOURS)
+    public_dir = os.path.dirname(feed_dir)
+
+    state = load_state(feed_dir)
+    if state is None:
+        # Primo avvio: il checkpoint 0 contiene la finestra già pubblicata nel manifest
+        state = {"seq": 0, "checkpoint": 0, "checkpoint_file": None, "oldest_delta": 1, "window_hours": FEED_WINDOW_HOURS}
+        current = load_window_from_manifest(public_dir, threshold)
+        compact_feed(feed_dir, state, current, now)
+    else:
+        current = load_current_items(feed_dir, state)
+
+    added = []
+    for item in news_items:
+        timestamp = parse_item_time(item)
+        if not item.get('link') or item.get('lat') is None or item.get('lon') is None or not timestamp:
+            continue
+        news_id = item_id(item)
+        if news_id not in current and timestamp > threshold:
+            added.append({**item, "id": news_id})
+            current[news_id] = added[-1]
+    removed = [news_id for news_id, item in current.items() if (parse_item_time(item) or threshold) <= threshold]
+    for news_id in removed:
+        del current[news_id]
+
+    if added or removed:
+        seq = state['seq'] + 1
+        timestamp = now.strftime(TIMESTAMP_FORMAT)
+        write_json(os.path.join(feed_dir, "deltas", f"{seq}.json"), {
+            "seq": seq, "timestamp": timestamp, "snapshot": snapshot, "added": added, "removed": removed,
+        })
+        with open(os.path.join(feed_dir, "changelog.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                "seq": seq, "timestamp": timestamp, "snapshot": snapshot,
+                "added": [item['id'] for item in added], "removed": removed,
+            }) + "\n")
+        state['seq'] = seq
+        print(f"Feed aggiornato al seq {seq}: {len(added)} notizie aggiunte, {len(removed)} rimosse.")
+        if seq - state['checkpoint'] >= CHECKPOINT_EVERY:
+            compact_feed(feed_dir, state, current, now)
+    else:
+        print("Feed invariato: nessuna notizia aggiunta o rimossa.")
+
+    # state.json è scritto per ultimo: i client vedono il nuovo seq solo a file completi
+    state['updated'] = now.strftime(TIMESTAMP_FORMAT)
+    write_json(os.path.join(feed_dir, "state.json"), state)
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feed incrementale (checkpoint + delta) delle notizie pubblicate.")
+    parser.add_argument("--feed-dir", default=FEED_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Mostra lo stato del feed")
+    subparsers.add_parser("compact", help="Forza la compattazione in un nuovo checkpoint")
+
+    args = parser.parse_args()
+    state = load_state(args.feed_dir)
+    if state is None:
+        print(f"Nessun feed in '{args.feed_dir}'.")
+        return
+    if args.command == "status":
+        items = load_current_items(args.feed_dir, state)
+        print(json.dumps(state, indent=2))
+        print(f"Notizie nella finestra: {len(items)}")
+    elif args.command == "compact":
+        now = datetime.utcnow().replace(microsecond=0)
+        compact_feed(args.feed_dir, state, load_current_items(args.feed_dir, state), now)
+        write_json(os.path.join(args.feed_dir, "state.json"), state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import os
+import hmac
+import json
+import time
+import socket
+import ipaddress
+import argparse
+import threading
+import requests
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from work_queue import (
+    open_queue, enqueue_articles, claim_batch, complete_article, fail_article,
+    fetch_finished, mark_published, queue_stats, LEASE_SECONDS
+)
+from geoloc_fetcher import (
+    read_rss_feeds_from_file, get_news_from_rss, analyze_articles, build_news_item,
+    publish_snapshot, setup_git_repository, write_markdown_file,
+    load_processed_links, save_processed_links, ASSET_STRUCTURE, ICON_COLLECTION
+)
+from geo_prefilter import new_prefilter_stats
+
+# --- CARICAMENTO VARIABILI D'AMBIENTE ---
+load_dotenv()
+# Token condiviso tra coordinatore e worker, inviato nell'header X-Queue-Token
+QUEUE_TOKEN = os.getenv("QUEUE_TOKEN", "")
+COORDINATOR_URL = os.getenv("COORDINATOR_URL", "http://localhost:8765")
+
+# --- CONFIGURAZIONE ---
+QUEUE_HOST = "0.0.0.0"
+QUEUE_PORT = 8765
+FETCH_INTERVAL = 7200   # Secondi tra due scaricamenti delle fonti (come run_continuously.sh)
+WORKER_BATCH_SIZE = 5
+MAX_CLAIM_SIZE = 50     # Articoli massimi per richiesta /claim
+WORKER_IDLE_SLEEP = 60
+
+
+# --- COORDINATORE ---
+def fetch_and_enqueue(conn):
+    """Scarica tutte le fonti e accoda gli articoli non ancora processati."""
+    all_sources = read_rss_feeds_from_file("fonti.txt")
+    if not all_sources:
+        return 0
+    processed_news_links = load_processed_links()
+    articles = [a for a in get_news_from_rss(all_sources) if a['link'] not in processed_news_links]
+    new_count = enqueue_articles(conn, articles)
+    print(f"Accodate {new_count} nuove notizie ({len(articles) - new_count} già in coda).")
+    return new_count
+
+
+def parse_request(path, data):
+    """Valida il corpo JSON di una richiesta dei worker; solleva ValueError se non è valido."""
+    if not isinstance(data, dict):
+        raise ValueError("il corpo deve essere un oggetto JSON")
+    worker_id = data.get("worker")
+    if not isinstance(worker_id, str) or not worker_id:
+        raise ValueError("campo 'worker' mancante")
+    request = {"worker": worker_id}
+    if path == "/claim":
+        request["n"] = max(1, min(int(data.get("n", WORKER_BATCH_SIZE)), MAX_CLAIM_SIZE))
+    elif path == "/complete":
+        results = data.get("results", [])
+        if not isinstance(results, list) or not all(
+            isinstance(r, dict) and isinstance(r.get("link"), str) and isinstance(r.get("result"), dict) for r in results
+        ):
+            raise ValueError("'results' deve essere una lista di {link, result}")
+        request["results"] = results
+    elif path == "/fail":
+        links = data.get("links", [])
+        if not isinstance(links, list) or not all(isinstance(link, str) for link in links):
+            raise ValueError("'links' deve essere una lista di link")
+        request["links"] = links
+        request["error"] = str(data.get("error", ""))
+    return request
+
+
+class QueueRequestHandler(BaseHTTPRequestHandler):
+    """API HTTP della coda: i worker chiedono batch di articoli e restituiscono i risultati."""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        token = self.headers.get("X-Queue-Token") or ""
+        if QUEUE_TOKEN and not hmac.compare_digest(token.encode('utf-8'), QUEUE_TOKEN.encode('utf-8')):
+            self._send_json(401, {"error": "Token non valido"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/stats":
+            conn = open_queue()
+            try:
+                self._send_json(200, queue_stats(conn))
+            finally:
+                conn.close()
+        else:
+            self._send_json(404, {"error": "Endpoint non trovato"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path not in ("/claim", "/complete", "/fail"):
+            self._send_json(404, {"error": "Endpoint non trovato"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = parse_request(self.path, json.loads(self.rfile.read(length) or b"{}"))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"Richiesta non valida: {e}"})
+            return
+
+        worker_id = data["worker"]
+        conn = open_queue()
+        try:
+            if self.path == "/claim":
+                articles = claim_batch(conn, worker_id, data["n"])
+                self._send_json(200, {"articles": articles, "lease_seconds": LEASE_SECONDS})
+            elif self.path == "/complete":
+                accepted = sum(complete_article(conn, worker_id, r["link"], r["result"]) for r in data["results"])
+                self._send_json(200, {"accepted": accepted})
+            else:
+                released = sum(fail_article(conn, worker_id, link, data["error"]) for link in data["links"])
+                self._send_json(200, {"released": released})
+        finally:
+            conn.close()
+
+    def log_message(self, format, *args):
+        print(f"[API] {self.address_string()} - {format % args}")
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def run_coordinator(host=QUEUE_HOST, port=QUEUE_PORT, interval=FETCH_INTERVAL):
+    """Serve la coda ai worker e, a ogni intervallo, pubblica i risultati e riscarica le fonti."""
+    # I risultati accettati finiscono sul repository pubblico: senza token si ascolta solo in locale
+    if not QUEUE_TOKEN and not is_loopback(host):
+        print("ERRORE: QUEUE_TOKEN non impostato. Impostarlo nel file .env oppure avviare con --host 127.0.0.1.")
+        return
+    conn = open_queue()
+    server = ThreadingHTTPServer((host, port), QueueRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Coordinatore in ascolto su http://{host}:{port}")
+
+    try:
+        while True:
+            publish_results(conn)
+            fetch_and_enqueue(conn)
+            print(f"Stato della coda: {queue_stats(conn)}")
+            print(f"In attesa di {interval // 60} minuti prima del prossimo ciclo...")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nCoordinatore interrotto dall'utente.")
+    finally:
+        server.shutdown()
+
+
+# --- PUBBLICAZIONE ---
+def publish_results(conn):
+    """
+    Unisce i risultati completati dai worker in un unico snapshot, lo pubblica su GitHub
+    e aggiorna il tracker delle notizie processate.
+    """
+    finished = fetch_finished(conn)
+    if not finished:
+        print("Nessun risultato da pubblicare.")
+        return
+
+    geolocated_news = []
+    failed_articles = []
+    for entry in finished:
+        item = (entry["result"] or {}).get("item")
+        if entry["status"] == "done" and item:
+            geolocated_news.append(item)
+        else:
+            failed_articles.append(entry["article"])
+    print(f"Risultati da pubblicare: {len(geolocated_news)} geolocalizzate, {len(failed_articles)} da revisionare.")
+
+    snapshot_name = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    if failed_articles:
+        backend_output_dir = os.path.join("outputs", snapshot_name)
+        os.makedirs(backend_output_dir, exist_ok=True)
+        write_markdown_file(failed_articles, os.path.join(backend_output_dir, "notizie_da_revisionare.md"))
+
+    if geolocated_news:
+        if not setup_git_repository():
+            print("Impossibile sincronizzare il repository Git. I risultati restano in coda.")
+            return
+        publish_snapshot(geolocated_news, snapshot_name)
+
+    processed_news_links = load_processed_links()
+    processed_news_links.update(entry["link"] for entry in finished)
+    save_processed_links(processed_news_links)
+    mark_published(conn, [entry["link"] for entry in finished])
+
+
+# --- WORKER ---
+def run_worker(coordinator_url=COORDINATOR_URL, worker_id=None, batch_size=WORKER_BATCH_SIZE):
+    """Chiede batch di articoli al coordinatore, li analizza con l'Ollama locale e invia i risultati."""
+    # Senza icone il worker assegnerebbe a tutto l'icona di riserva, pubblicata senza avvisi
+    if not ASSET_STRUCTURE or not ICON_COLLECTION:
+        print("Uscita: il worker richiede 'assets_structure.json' e il database delle icone 'icon_db' (python3 icon_index.py sync).")
+        return
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    session = requests.Session()
+    session.headers["X-Queue-Token"] = QUEUE_TOKEN
+    print(f"Worker '{worker_id}' collegato a {coordinator_url}")
+
+    while True:
+        try:
+            response = session.post(f"{coordinator_url}/claim", json={"worker": worker_id, "n": batch_size}, timeout=30)
+            response.raise_for_status()
+            articles = response.json()["articles"]
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            print(f"Errore di comunicazione con il coordinatore: {e}. Riprovo tra {WORKER_IDLE_SLEEP} secondi...")
+            time.sleep(WORKER_IDLE_SLEEP)
+            continue
+
+        if not articles:
+            time.sleep(WORKER_IDLE_SLEEP)
+            continue
+
+        print(f"\nRicevute {len(articles)} notizie da analizzare.")
+        links = [a['link'] for a in articles]
+        try:
+            analyses = analyze_articles(articles, new_prefilter_stats())
+        except Exception as e:
+            print(f"ERRORE durante l'analisi del batch: {e}")
+            try:
+                session.post(f"{coordinator_url}/fail", json={"worker": worker_id, "links": links, "error": str(e)}, timeout=30)
+            except requests.exceptions.RequestException as fail_error:
+                # Il lease scadrà e il batch verrà riassegnato
+                print(f"ERRORE nella segnalazione del fallimento al coordinatore: {fail_error}")
+            continue
+
+        results = []
+        for analysis in analyses:
+            geolocated = analysis["lat"] and analysis["lon"]
+            results.append({
+                "link": analysis["article"]["link"],
+                "result": {
+                    "item": build_news_item(analysis) if geolocated else None,
+                    "location_name": analysis["location_name"],
+                    "icon_name": analysis["icon_name"],
+                    "model": analysis.get("geo_model"),
+                    "worker": worker_id,
+                },
+            })
+        try:
+            response = session.post(f"{coordinator_url}/complete", json={"worker": worker_id, "results": results}, timeout=30)
+            response.raise_for_status()
+            print(f"Inviati {len(results)} risultati, accettati: {response.json().get('accepted')}.")
+        except requests.exceptions.RequestException as e:
+            # Il lease scadrà e il batch verrà riassegnato
+            print(f"ERRORE nell'invio dei risultati: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analisi distribuita delle notizie su più host Ollama.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    coordinator_parser = subparsers.add_parser("coordinator", help="Scarica le fonti, serve la coda e pubblica")
+    coordinator_parser.add_argument("--host", default=QUEUE_HOST)
+    coordinator_parser.add_argument("--port", type=int, default=QUEUE_PORT)
+    coordinator_parser.add_argument("--interval", type=int, default=FETCH_INTERVAL, help="Secondi tra due cicli")
+
+    worker_parser = subparsers.add_parser("worker", help="Analizza batch di notizie con l'Ollama locale")
+    worker_parser.add_argument("--coordinator", default=COORDINATOR_URL)
+    worker_parser.add_argument("--id", default=None, help="Identificativo del worker")
+    worker_parser.add_argument("--batch-size", type=int, default=WORKER_BATCH_SIZE)
+
+    subparsers.add_parser("publish", help="Pubblica subito i risultati completati")
+    subparsers.add_parser("status", help="Mostra lo stato della coda")
+
+    args = parser.parse_args()
+    if args.command == "coordinator":
+        run_coordinator(args.host, args.port, args.interval)
+    elif args.command == "worker":
+        run_worker(args.coordinator, args.id, args.batch_size)
+    elif args.command == "publish":
+        publish_results(open_queue())
+    elif args.command == "status":
+        print(json.dumps(queue_stats(open_queue()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
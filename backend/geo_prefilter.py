@@ -0,0 +1,415 @@
+import os
+import re
+import json
+import glob
+import math
+import unicodedata
+from collections import deque, defaultdict
+
+# --- CONFIGURAZIONE ---
+GAZETTEER_FILE = "gazetteer.json"
+# Soglia di confidenza oltre la quale la chiamata LLM di geolocalizzazione viene saltata
+PREFILTER_THRESHOLD = float(os.getenv("PREFILTER_THRESHOLD", "0.8"))
+# Frazione delle notizie sopra soglia che passa comunque dal LLM per misurare l'accordo
+PREFILTER_AUDIT_RATE = float(os.getenv("PREFILTER_AUDIT_RATE", "0.1"))
+PREFILTER_AUDIT_FILE = "prefilter_audit.jsonl"
+# Distanza massima tra il punto del pre-classificatore e quello geocodificato dal LLM
+# perché i due vengano considerati la stessa località
+AGREEMENT_DISTANCE_KM = float(os.getenv("PREFILTER_AGREEMENT_KM", "50"))
+
+# Pesi delle evidenze
+DATELINE_WEIGHT = 3.0
+TITLE_WEIGHT = 2.0
+CONTENT_WEIGHT = 1.0
+MAX_CONTENT_MENTIONS = 2
+PRIOR_WEIGHT = 1.0
+# Punteggio oltre il quale la quantità di evidenze non aumenta più la confidenza
+SATURATION_SCORE = 4.0
+
+# Nazione "di casa" delle fonti: una notizia di Corriere Canadese parla spesso del Canada
+SOURCE_PRIORS = {
+    "Corriere Canadese": "Canada",
+    "La Voce di New York": "United States",
+    "Ansa Home": "Italy",
+}
+
+# Sezioni degli URL che rivelano il continente (ANSA) o la nazione della notizia
+URL_CONTINENT_PRIORS = {
+    "/mondo/europa/": "europa",
+    "/mondo/nordamerica/": "nordamerica",
+    "/mondo/americalatina/": "americalatina",
+    "/mondo/mediooriente/": "mediooriente",
+    "/mondo/asia/": "asia",
+    "/mondo/africa/": "africa",
+}
+URL_COUNTRY_PRIORS = {
+    "/notizie/cronaca/": "Italy",
+    "/notizie/politica/": "Italy",
+    "/en/new-york/": "United States",
+}
+
+# Dateline giornalistica in testa all'articolo, es. "TORONTO – ..." o "(ANSA) – WASHINGTON, 07 AGO – ..."
+DATELINE_PATTERN = re.compile(
+    r"^\s*(?:\(ANSA\)\s*[–—-]\s*)?"
+    r"([A-ZÀ-Ý][A-ZÀ-Ý'’. ]{1,40}?)"
+    r"(?:\s*,\s*\d{1,2}\s+[A-Z]{3,4})?"
+    r"\s*[–—-]\s"
+)
+
+
+def _fold_char(ch):
+    """Normalizza un singolo carattere (minuscolo, senza accenti) mantenendo la lunghezza del testo."""
+    if ch in "’`":
+        return "'"
+    base = unicodedata.normalize("NFKD", ch)[:1] or ch
+    folded = base.lower()
+    return folded if len(folded) == 1 else ch
+
+
+def normalize_text(text):
+    return "".join(_fold_char(ch) for ch in text)
+
+
+# --- AUTOMA DI AHO-CORASICK ---
+def build_automaton(patterns):
+    """
+    Costruisce un automa di Aho-Corasick (trie con link di fallimento) sui pattern dati,
+    per trovare tutte le occorrenze in un'unica passata sul testo.
+    """
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+    for pattern_id, pattern in enumerate(patterns):
+        node = 0
+        for ch in pattern:
+            next_node = goto[node].get(ch)
+            if next_node is None:
+                goto.append({})
+                fail.append(0)
+                output.append([])
+                next_node = len(goto) - 1
+                goto[node][ch] = next_node
+            node = next_node
+        output[node].append(pattern_id)
+
+    # Visita in ampiezza per calcolare i link di fallimento
+    queue = deque(goto[0].values())
+    while queue:
+        node = queue.popleft()
+        for ch, next_node in goto[node].items():
+            queue.append(next_node)
+            state = fail[node]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            fail[next_node] = goto[state].get(ch, 0)
+            output[next_node].extend(output[fail[next_node]])
+
+    return {"goto": goto, "fail": fail, "output": output, "patterns": patterns}
+
+
+def search_automaton(automaton, text):
+    """Restituisce le occorrenze come tuple (inizio, fine, id_pattern)."""
+    goto, fail, output, patterns = automaton["goto"], automaton["fail"], automaton["output"], automaton["patterns"]
+    matches = []
+    node = 0
+    for i, ch in enumerate(text):
+        while node and ch not in goto[node]:
+            node = fail[node]
+        node = goto[node].get(ch, 0)
+        for pattern_id in output[node]:
+            matches.append((i - len(patterns[pattern_id]) + 1, i + 1, pattern_id))
+    return matches
+
+
+# --- CARICAMENTO GAZETTEER ---
+def load_gazetteer(path=GAZETTEER_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    patterns = []
+    pattern_entries = []
+    for entry in entries:
+        for name in entry["names"]:
+            patterns.append(normalize_text(name))
+            pattern_entries.append(entry)
+    return entries, pattern_entries, build_automaton(patterns)
+
+
+try:
+    GAZETTEER, PATTERN_ENTRIES, PLACE_AUTOMATON = load_gazetteer()
+    print(f"Caricato gazetteer di {len(GAZETTEER)} località da '{GAZETTEER_FILE}'.")
+except (FileNotFoundError, json.JSONDecodeError) as e:
+    print(f"ATTENZIONE: gazetteer '{GAZETTEER_FILE}' non disponibile, pre-classificatore disattivato: {e}")
+    GAZETTEER, PATTERN_ENTRIES, PLACE_AUTOMATON = [], [], None
+
+
+def find_places(text):
+    """
+    Trova le località del gazetteer citate nel testo. Richiede l'iniziale maiuscola e i confini
+    di parola, e tra occorrenze sovrapposte tiene la più lunga ("New York" batte "York").
+    """
+    if not PLACE_AUTOMATON or not text:
+        return []
+    candidates = []
+    for start, end, pattern_id in search_automaton(PLACE_AUTOMATON, normalize_text(text)):
+        if not text[start].isupper():
+            continue
+        if start > 0 and text[start - 1].isalnum():
+            continue
+        if end < len(text) and text[end].isalnum():
+            continue
+        candidates.append((start, end, pattern_id))
+
+    candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+    places = []
+    last_end = -1
+    for start, end, pattern_id in candidates:
+        if start < last_end:
+            continue
+        places.append(PATTERN_ENTRIES[pattern_id])
+        last_end = end
+    return places
+
+
+def extract_dateline(content):
+    """
+    Restituisce la voce del gazetteer corrispondente alla dateline dell'articolo (o None)
+    e la posizione in cui finisce la dateline nel testo.
+    """
+    match = DATELINE_PATTERN.match(content or "")
+    if not match:
+        return None, 0
+    places = find_places(match.group(1).strip().title())
+    return (places[0] if places else None), match.end()
+
+
+def get_url_priors(article):
+    """Restituisce (nazione, continente) indicati dalla sola sezione dell'URL dell'articolo."""
+    url_country, url_continent = None, None
+    link = article.get('link', '')
+    for section, country in URL_COUNTRY_PRIORS.items():
+        if section in link:
+            url_country = country
+    for section, continent in URL_CONTINENT_PRIORS.items():
+        if section in link:
+            url_continent = continent
+    return url_country, url_continent
+
+
+def get_priors(article):
+    """Restituisce (nazione, continente) suggeriti dalla fonte e dall'URL dell'articolo."""
+    url_country, url_continent = get_url_priors(article)
+    return url_country or SOURCE_PRIORS.get(article.get('source')), url_continent
+
+
+def classify_article(article):
+    """
+    Pre-classificatore a regole: combina dateline, località citate e prior della fonte.
+    Restituisce un dizionario con località, coordinate e confidenza (0-1), oppure None
+    se nel testo non c'è alcuna evidenza geografica.
+    """
+    scores = defaultdict(float)
+    evidence = defaultdict(list)
+
+    content = article.get('content', '')
+    dateline_entry, dateline_end = extract_dateline(content)
+    if dateline_entry:
+        scores[dateline_entry["location"]] += DATELINE_WEIGHT
+        evidence[dateline_entry["location"]].append("dateline")
+
+    for entry in find_places(article.get('title', '')):
+        scores[entry["location"]] += TITLE_WEIGHT
+        evidence[entry["location"]].append("titolo")
+
+    content_mentions = defaultdict(int)
+    for entry in find_places(content[dateline_end:]):
+        content_mentions[entry["location"]] += 1
+    for location, count in content_mentions.items():
+        scores[location] += CONTENT_WEIGHT * min(count, MAX_CONTENT_MENTIONS)
+        evidence[location].append("testo")
+
+    if not scores:
+        return None
+
+    entries_by_location = {entry["location"]: entry for entry in GAZETTEER}
+    country_scores = defaultdict(float)
+    for location, score in scores.items():
+        country_scores[entries_by_location[location]["country"]] += score
+
+    prior_country, prior_continent = get_priors(article)
+    for country in list(country_scores):
+        continent = next(e["continent"] for e in GAZETTEER if e["country"] == country)
+        if prior_country == country:
+            country_scores[country] += PRIOR_WEIGHT
+        if prior_continent:
+            country_scores[country] += PRIOR_WEIGHT if prior_continent == continent else -PRIOR_WEIGHT
+        country_scores[country] = max(country_scores[country], 0.0)
+
+    best_country = max(country_scores, key=country_scores.get)
+    best_score = country_scores[best_country]
+    total_score = sum(country_scores.values())
+    if best_score <= 0:
+        return None
+
+    # All'interno della nazione scelta preferisce la località più specifica e più citata
+    specificity = {"city": 2, "region": 1, "country": 0}
+
+    def rank(location):
+        kind_rank = specificity.get(entries_by_location[location]["kind"], 0)
+        return (kind_rank > 0, scores[location], kind_rank)
+
+    best_location = max((loc for loc in scores if entries_by_location[loc]["country"] == best_country), key=rank)
+
+    best_entry = entries_by_location[best_location]
+    confidence = (best_score / total_score) * min(1.0, best_score / SATURATION_SCORE)
+    return {
+        "location": best_entry["location"],
+        "country": best_entry["country"],
+        "lat": best_entry["lat"],
+        "lon": best_entry["lon"],
+        "confidence": round(confidence, 3),
+        "evidence": sorted({e for loc in scores for e in evidence[loc]}),
+    }
+
+
+# --- MISURA DELL'ACCORDO CON IL LLM ---
+def country_of(location_name):
+    """Estrae la nazione (ultimo componente) da una località nel formato "città, regione, nazione"."""
+    if not location_name or location_name == "N/A":
+        return None
+    return location_name.split(",")[-1].strip()
+
+
+# Nomi alternativi con cui il LLM indica spesso le nazioni
+COUNTRY_ALIASES = {
+    "usa": "united states", "us": "united states", "united states of america": "united states",
+    "stati uniti": "united states", "uk": "united kingdom", "great britain": "united kingdom",
+    "england": "united kingdom", "italia": "italy", "russian federation": "russia",
+    "czech republic": "czechia", "türkiye": "turkey", "palestine": "palestinian territories",
+}
+
+
+def same_country(country_a, country_b):
+    """Confronta due nomi di nazione tollerando maiuscole e alias comuni."""
+    if not country_a or not country_b:
+        return False
+    a, b = country_a.strip().lower(), country_b.strip().lower()
+    return COUNTRY_ALIASES.get(a, a) == COUNTRY_ALIASES.get(b, b)
+
+
+def continent_of(country):
+    """Continente di una nazione secondo il gazetteer (stesse chiavi di URL_CONTINENT_PRIORS), o None."""
+    for entry in GAZETTEER:
+        if same_country(entry["country"], country):
+            return entry["continent"]
+    return None
+
+
+def new_prefilter_stats():
+    return {"total": 0, "skipped": 0, "records": []}
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distanza in km lungo il cerchio massimo (formula dell'emisenoverso)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def record_prefilter_result(stats, article, guess, llm_location=None, llm_lat=None, llm_lon=None, skipped=False):
+    """
+    Registra l'esito del pre-classificatore e, se disponibile, il confronto con la risposta del LLM:
+    sia sulla nazione sia sulla distanza tra il punto del gazetteer (quello che verrebbe pubblicato)
+    e il punto geocodificato dal LLM.
+    """
+    stats["total"] += 1
+    if skipped:
+        stats["skipped"] += 1
+    if not guess or llm_location is None:
+        return
+    llm_country = country_of(llm_location)
+    distance = None
+    if llm_lat is not None and llm_lon is not None:
+        distance = round(distance_km(guess["lat"], guess["lon"], llm_lat, llm_lon), 1)
+    stats["records"].append({
+        "link": article.get('link', ''),
+        "source": article.get('source', ''),
+        "confidence": guess["confidence"],
+        "prefilter_location": guess["location"],
+        "llm_location": llm_location,
+        "distance_km": distance,
+        "agree": same_country(llm_country, guess["country"]),
+        "agree_location": distance <= AGREEMENT_DISTANCE_KM if distance is not None else None,
+    })
+
+
+def write_prefilter_audit(stats, output_dir):
+    with open(os.path.join(output_dir, PREFILTER_AUDIT_FILE), 'w', encoding='utf-8') as f:
+        for record in stats["records"]:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def location_agrees(record):
+    # Senza distanza (log precedenti o località del LLM non geocodificata) si usa solo la nazione
+    agree_location = record.get("agree_location")
+    return record["agree"] if agree_location is None else agree_location
+
+
+def agreement_by_threshold(records, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9)):
+    """
+    Per ogni soglia candidata calcola quante notizie verrebbero saltate, con che accordo
+    sulla località (entro AGREEMENT_DISTANCE_KM) e con che accordo sulla sola nazione.
+    """
+    rows = []
+    for threshold in thresholds:
+        above = [r for r in records if r["confidence"] >= threshold]
+        location_agreement = sum(location_agrees(r) for r in above) / len(above) if above else None
+        country_agreement = sum(r["agree"] for r in above) / len(above) if above else None
+        rows.append((threshold, len(above), location_agreement, country_agreement))
+    return rows
+
+
+def summarize_prefilter(stats):
+    """Restituisce le righe di report sul pre-classificatore."""
+    total = stats["total"]
+    skip_rate = stats["skipped"] / total if total else 0.0
+    records = stats["records"]
+    lines = [
+        f"- Soglia di confidenza: {PREFILTER_THRESHOLD} (audit: {PREFILTER_AUDIT_RATE:.0%})",
+        f"- Chiamate LLM di geolocalizzazione saltate: {stats['skipped']}/{total} ({skip_rate:.1%})",
+        f"- Confronti con il LLM: {len(records)}",
+    ]
+    if records:
+        location_agreement = sum(location_agrees(r) for r in records) / len(records)
+        country_agreement = sum(r["agree"] for r in records) / len(records)
+        distances = sorted(r["distance_km"] for r in records if r.get("distance_km") is not None)
+        lines.append(
+            f"- Accordo sulla località (entro {AGREEMENT_DISTANCE_KM:.0f} km): {location_agreement:.1%}, "
+            f"sulla nazione: {country_agreement:.1%}"
+            + (f", distanza mediana: {distances[len(distances) // 2]:.0f} km" if distances else "")
+        )
+    for threshold, count, location_agreement, country_agreement in agreement_by_threshold(records):
+        if location_agreement is not None:
+            lines.append(
+                f"  - confidenza >= {threshold}: {count} confronti, accordo località {location_agreement:.1%}, "
+                f"nazione {country_agreement:.1%}"
+            )
+    return lines
+
+
+if __name__ == "__main__":
+    # Aggrega i log di audit di tutte le esecuzioni per scegliere la soglia
+    all_records = []
+    for audit_path in sorted(glob.glob(os.path.join("outputs", "*", PREFILTER_AUDIT_FILE))):
+        with open(audit_path, 'r', encoding='utf-8') as f:
+            all_records.extend(json.loads(line) for line in f if line.strip())
+
+    if not all_records:
+        print("Nessun log di audit del pre-classificatore trovato in 'outputs/'.")
+    else:
+        print(f"Confronti pre-classificatore/LLM raccolti: {len(all_records)}\n")
+        print(f"Soglia | Notizie sopra soglia | Accordo località (<= {AGREEMENT_DISTANCE_KM:.0f} km) | Accordo nazione")
+        for threshold, count, location_agreement, country_agreement in agreement_by_threshold(all_records, [t / 20 for t in range(6, 20)]):
+            location_str = f"{location_agreement:.1%}" if location_agreement is not None else "-"
+            country_str = f"{country_agreement:.1%}" if country_agreement is not None else "-"
+            print(f"{threshold:.2f}   | {count:>20} | {location_str:>30} | {country_str}")
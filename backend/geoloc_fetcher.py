@@ -10,7 +10,16 @@ from datetime import datetime
 import urllib.parse
 import random
 import subprocess
+import sqlite3
 from dotenv import load_dotenv
+from news_archive import archive_news
+from icon_atlas import build_icon_atlas
+from delta_feed import publish_delta
+from news_manifest import update_manifest
+from geo_prefilter import (
+    classify_article, PREFILTER_THRESHOLD, PREFILTER_AUDIT_RATE, get_url_priors, continent_of, country_of, same_country,
+    new_prefilter_stats, record_prefilter_result, summarize_prefilter, write_prefilter_audit
+)
 
 # --- CARICAMENTO VARIABILI D'AMBIENTE ---
 load_dotenv()
@@ -20,16 +29,26 @@ GITHUB_BRANCH = os.getenv("GITHUB_BRANCH_NAME")
 REPO_LOCAL_PATH = "GloboNews_repo" # Nome della cartella locale per il clone
 
 # --- CONFIGURAZIONE ---
-OLLAMA_URL = "http://localhost:11434/api/generate"
+# Host Ollama configurabile, così i worker distribuiti usano ciascuno il proprio modello locale
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_URL = f"{OLLAMA_HOST}/api/generate"
+OLLAMA_EMBEDDINGS_URL = f"{OLLAMA_HOST}/api/embeddings"
 OLLAMA_MODEL = "gemma3n:e2b"
+# Cascata: le geolocalizzazioni incerte del modello veloce passano subito al modello grande
+OLLAMA_MODEL_LARGE = "gemma3n:e4b"
+CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.6"))
 EMBEDDING_MODEL = "nomic-embed-text"
 USER_AGENT = "NotizIA-App/1.0"
 ASSETS_FILE = "assets_structure.json"
 DEFAULT_ICON = "Newspaper"
 DB_PATH = "icon_db"
 COLLECTION_NAME = "fluent_icons"
-# Modifica: Il manifest ora si trova nel repo clonato
-MANIFEST_FILE = os.path.join(REPO_LOCAL_PATH, "public/news_manifest.json")
+# Modalità batch: numero massimo di notizie per richiesta al LLM (1 = una notizia per chiamata)
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "1"))
+# Finestra di contesto del modello: il batch viene riempito finché la stima dei token ci sta
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))
+LLM_OUTPUT_TOKENS_PER_ARTICLE = 120
+DEFAULT_CHARS_PER_TOKEN = 3.5
 SOURCE_TRACKER_FILE = "source_tracker.json"
 PROCESSED_NEWS_TRACKER_FILE = "processed_news_tracker.json"
 
@@ -52,21 +71,37 @@ try:
     client = chromadb.PersistentClient(path=DB_PATH)
     ICON_COLLECTION = client.get_collection(name=COLLECTION_NAME)
     print(f"Connesso alla collezione '{COLLECTION_NAME}' con {ICON_COLLECTION.count()} elementi.")
+    indexed_model = (ICON_COLLECTION.metadata or {}).get("embedding_model")
+    if indexed_model != EMBEDDING_MODEL:
+        print(f"ATTENZIONE: la collezione è indicizzata con '{indexed_model}' invece di '{EMBEDDING_MODEL}'. Eseguire 'python3 icon_index.py sync'.")
 except Exception as e:
     print(f"ERRORE: Impossibile connettersi al database vettoriale: {e}")
     ICON_COLLECTION = None
 
 
-def call_llm(prompt, format="json", max_retries=3, retry_delay=5):
+# Statistiche delle chiamate LLM, usate anche per misurare il rapporto caratteri/token del prompt
+LLM_STATS = {"calls": 0, "prompt_chars": 0, "prompt_tokens": 0, "models": {}, "geolocations": 0, "escalations": {}}
+
+# Scopo della chiamata, per misurare separatamente le latenze: "geo" (geolocalizzazione di una
+# notizia), "keywords" (parole chiave di una notizia), "batch" (più notizie in un solo prompt)
+def call_llm(prompt, format="json", max_retries=3, retry_delay=5, options=None, model=OLLAMA_MODEL, purpose="altro"):
+    payload = {"model": model, "prompt": prompt, "stream": False, "format": format}
+    if options:
+        payload["options"] = options
     for attempt in range(max_retries):
         try:
-            response = requests.post(
-                OLLAMA_URL,
-                json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "format": format},
-                timeout=300
-            )
+            start = time.perf_counter()
+            response = requests.post(OLLAMA_URL, json=payload, timeout=300)
             response.raise_for_status()
-            response_text = response.json().get("response", "{}")
+            response_json = response.json()
+            LLM_STATS["calls"] += 1
+            call_stats = LLM_STATS["models"].setdefault(model, {}).setdefault(purpose, {"calls": 0, "seconds": 0.0})
+            call_stats["calls"] += 1
+            call_stats["seconds"] += time.perf_counter() - start
+            if response_json.get("prompt_eval_count"):
+                LLM_STATS["prompt_chars"] += len(prompt)
+                LLM_STATS["prompt_tokens"] += response_json["prompt_eval_count"]
+            response_text = response_json.get("response", "{}")
             return response_text, None
         except requests.exceptions.RequestException as e:
             error_msg = f"Errore di connessione a Ollama (generativo) [Tentativo {attempt + 1}/{max_retries}]: {e}"
@@ -84,7 +119,7 @@ def get_embedding(text, max_retries=3, retry_delay=5):
     for attempt in range(max_retries):
         try:
             response = requests.post(
-                "http://localhost:11434/api/embeddings",
+                OLLAMA_EMBEDDINGS_URL,
                 json={"model": EMBEDDING_MODEL, "prompt": text},
                 timeout=300
             )
@@ -118,7 +153,7 @@ def get_keywords_from_article(article):
     
     Testo: "{article['title']}. {article['content']}"
     """
-    response_str, error = call_llm(prompt)
+    response_str, error = call_llm(prompt, purpose="keywords")
     if error:
         return [], error
     try:
@@ -149,7 +184,11 @@ def find_best_icon_vector_search(keywords):
         return DEFAULT_ICON, f"Errore durante la query al DB vettoriale: {e}"
 
 
-def get_geolocation_for_article(article):
+def get_geolocation_for_article(article, model=OLLAMA_MODEL):
+    """
+    Geolocalizza una notizia con il modello indicato.
+    Restituisce (località, confidenza dichiarata dal modello, errore).
+    """
     prompt = f"""
 Sei un analista geografo esperto per un'agenzia di stampa mondiale. Il tuo unico compito è leggere una notizia e posizionarla correttamente su una mappa.
 
@@ -164,35 +203,240 @@ Sei un analista geografo esperto per un'agenzia di stampa mondiale. Il tuo unico
   "city": "Nome della città (se applicabile)",
   "region": "Nome della regione/stato (se applicabile)",
   "country": "Nome della nazione (in inglese, obbligatorio)",
-  "reasoning": "Una frase che spiega perché questa è la località centrale della notizia."
+  "reasoning": "Una frase che spiega perché questa è la località centrale della notizia.",
+  "confidence": "Un numero tra 0 e 1: quanto sei sicuro della località (1 = indicata esplicitamente nel testo, 0 = nessun indizio)."
 }}
 
 **Testo della notizia da analizzare:**
 {article['title']}. {article['content']}
 """
-    response_str, error = call_llm(prompt, format="json") # Assicuriamoci che il formato sia json
+    response_str, error = call_llm(prompt, format="json", model=model, purpose="geo") # Assicuriamoci che il formato sia json
     if error:
-        return None, error # Restituisce None e l'errore
+        return None, 0.0, error # Restituisce None e l'errore
 
     try:
         # Parsa l'intera risposta JSON
         data = json.loads(response_str)
-        
-        city = data.get("city", "")
-        region = data.get("region", "")
-        country = data.get("country", "")
-        
-        # Costruisce il nome della località in ordine di specificità
-        location_parts = [part for part in [city, region, country] if part]
-        location_name = ", ".join(location_parts)
-        
+        location_name = build_location_name(data)
+
         # Se non c'è un paese, consideriamo la geolocalizzazione fallita
-        if not country:
-            return "N/A", "Nessuna nazione identificata dal LLM."
-            
-        return location_name, None
-    except (json.JSONDecodeError, KeyError) as e:
-        return "N/A", f"Errore nel parsing JSON o chiave mancante: {e} | Risposta ricevuta: {response_str}"
+        if not location_name:
+            return "N/A", 0.0, "Nessuna nazione identificata dal LLM."
+
+        return location_name, parse_confidence(data.get("confidence")), None
+    except (json.JSONDecodeError, KeyError, AttributeError) as e:
+        return "N/A", 0.0, f"Errore nel parsing JSON o chiave mancante: {e} | Risposta ricevuta: {response_str}"
+
+
+def parse_confidence(value):
+    """Normalizza la confidenza dichiarata dal modello in [0, 1]; 0 se assente o non numerica."""
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    # Alcune risposte usano una scala 0-100
+    if confidence > 1:
+        confidence /= 100
+    return min(max(confidence, 0.0), 1.0)
+
+
+def escalation_reason(location_name, confidence, lat, article):
+    """
+    Controlli di coerenza sulla risposta del modello veloce. Restituisce il motivo per cui
+    la notizia va ripassata al modello grande, oppure None se la risposta è affidabile.
+    """
+    if not location_name or location_name == "N/A":
+        return "nazione mancante"
+    if lat is None:
+        return "geocodifica fallita"
+    if confidence < CASCADE_CONFIDENCE_THRESHOLD:
+        return "confidenza bassa"
+    # Solo la sezione dell'URL contraddice la risposta: la fonte da sola non basta, perché tutte
+    # le fonti configurate coprono più paesi (ANSA il mondo, Corriere Canadese anche l'Italia)
+    url_country, url_continent = get_url_priors(article)
+    country = country_of(location_name)
+    if url_continent:
+        continent = continent_of(country)
+        if continent and continent != url_continent:
+            return "continente diverso dalla sezione dell'URL"
+    elif url_country and not same_country(country, url_country):
+        return "nazione diversa dalla sezione dell'URL"
+    return None
+
+
+def build_location_name(data):
+    """Costruisce "città, regione, nazione" dalla risposta del LLM; None se manca la nazione."""
+    city = data.get("city", "")
+    region = data.get("region", "")
+    country = data.get("country", "")
+    if not country:
+        return None
+    # Costruisce il nome della località in ordine di specificità
+    return ", ".join(part for part in [city, region, country] if part and isinstance(part, str))
+
+
+# --- MODALITÀ BATCH ---
+BATCH_PROMPT_PREAMBLE = """
+Sei un analista geografo esperto per un'agenzia di stampa mondiale. Riceverai più notizie, ognuna preceduta da un identificativo.
+Per OGNI notizia svolgi due compiti:
+
+1.  **Geolocalizzazione** (solo per le notizie marcate geo=si): individua il "fulcro geografico" della notizia, cioè dove si concentra l'azione. Scarta le menzioni periferiche: se la notizia parla di una crisi a Gaza e il presidente del Brasile commenta, il fulcro è Gaza. Per le notizie marcate geo=no lascia vuoti "city", "region" e "country".
+2.  **Tema visivo**: estrai da 3 a 5 parole chiave in INGLESE che descrivano il tema visivo centrale. La prima parola chiave deve essere la più importante e concreta possibile (es. un incidente in bicicletta -> "bicycle").
+
+**Formato di output (solo JSON, un elemento per ogni notizia, con lo stesso "id"):**
+{"results": [{"id": "1", "city": "Nome della città (se applicabile)", "region": "Nome della regione/stato (se applicabile)", "country": "Nome della nazione (in inglese)", "confidence": 0.9, "keywords": ["bicycle", "accident", "road"]}]}
+Il campo "confidence" è un numero tra 0 e 1 che indica quanto sei sicuro della località (1 = indicata esplicitamente nel testo).
+
+**Notizie da analizzare:**
+"""
+
+
+def estimate_tokens(text):
+    """Stima i token di un testo usando il rapporto caratteri/token misurato sulle chiamate precedenti."""
+    if LLM_STATS["prompt_tokens"]:
+        chars_per_token = LLM_STATS["prompt_chars"] / LLM_STATS["prompt_tokens"]
+    else:
+        chars_per_token = DEFAULT_CHARS_PER_TOKEN
+    return int(len(text) / chars_per_token) + 1
+
+
+def format_batch_item(item_id, article, need_location):
+    return f"\n[id={item_id} geo={'si' if need_location else 'no'}]\n{article['title']}. {article['content']}\n"
+
+
+def take_batch(queue):
+    """
+    Estrae dalla coda il prossimo batch: al massimo LLM_BATCH_SIZE notizie, finché la stima
+    di prompt e risposta rientra nella finestra di contesto del modello.
+    """
+    batch = []
+    used_tokens = estimate_tokens(BATCH_PROMPT_PREAMBLE)
+    while queue and len(batch) < LLM_BATCH_SIZE:
+        index, article, need_location = queue[0]
+        cost = estimate_tokens(format_batch_item(index, article, need_location)) + LLM_OUTPUT_TOKENS_PER_ARTICLE
+        if batch and used_tokens + cost > LLM_CONTEXT_TOKENS:
+            break
+        batch.append(queue.pop(0))
+        used_tokens += cost
+    return batch
+
+
+def analyze_batch(batch):
+    """
+    Analizza più notizie con un'unica chiamata al LLM. Restituisce un dizionario
+    id -> {"keywords", "location_name", "confidence"} con i soli campi che superano la
+    validazione: se la località non è valida restano solo le parole chiave.
+    """
+    prompt = BATCH_PROMPT_PREAMBLE + "".join(format_batch_item(i, a, geo) for i, a, geo in batch)
+    response_str, error = call_llm(prompt, options={"num_ctx": LLM_CONTEXT_TOKENS}, purpose="batch")
+    if error:
+        return {}, error
+    try:
+        items = json.loads(response_str).get("results", [])
+    except (json.JSONDecodeError, AttributeError):
+        return {}, f"Errore nel parsing JSON della risposta batch: {response_str[:200]}"
+
+    expected = {str(i): geo for i, _, geo in batch}
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or str(item.get("id")) not in expected:
+            continue
+        item_id = str(item["id"])
+        keywords = item.get("keywords")
+        if not isinstance(keywords, list) or not keywords or not all(isinstance(k, str) for k in keywords):
+            continue
+        result = {"keywords": keywords}
+        if expected[item_id]:
+            # Senza località valida si tengono le parole chiave: verrà ripetuta solo la geolocalizzazione
+            location_name = build_location_name(item)
+            if location_name:
+                result["location_name"] = location_name
+                result["confidence"] = parse_confidence(item.get("confidence"))
+        results[item_id] = result
+    return results, None
+
+
+def run_llm_batches(analyses):
+    """
+    Precompila località e parole chiave delle analisi con chiamate batch. Gli elementi non
+    validi restano vuoti e vengono poi ripresi con le chiamate singole.
+    """
+    queue = [(i, a["article"], not a["skip_llm_geo"]) for i, a in enumerate(analyses)]
+    while queue:
+        batch = take_batch(queue)
+        print(f"  - Batch LLM di {len(batch)} notizie ({len(queue)} ancora in coda)...")
+        results, error = analyze_batch(batch)
+        if error:
+            print(f"    ! {error}")
+        missing_location = 0
+        for index, _, need_location in batch:
+            result = results.get(str(index))
+            if result:
+                analyses[index].update(result)
+                missing_location += need_location and "location_name" not in result
+        missing = len(batch) - len(results)
+        if missing:
+            print(f"    ! {missing} notizie non valide, verranno riprocessate singolarmente.")
+        if missing_location:
+            print(f"    ! {missing_location} notizie senza località valida, verrà ripetuta solo la geolocalizzazione.")
+
+
+def analyze_articles(articles, prefilter_stats):
+    """
+    Geolocalizza e associa un'icona a ogni notizia. Restituisce una lista di analisi con
+    località, coordinate, parole chiave e icona per ciascun articolo.
+    """
+    analyses = []
+    for article in articles:
+        # Percorso veloce: se dateline, gazetteer e prior bastano, il LLM non serve
+        guess = classify_article(article)
+        skip_llm_geo = bool(guess) and guess["confidence"] >= PREFILTER_THRESHOLD and random.random() >= PREFILTER_AUDIT_RATE
+        analyses.append({"article": article, "guess": guess, "skip_llm_geo": skip_llm_geo})
+
+    if LLM_BATCH_SIZE > 1:
+        print(f"\nAnalisi batch (fino a {LLM_BATCH_SIZE} notizie per richiesta)...")
+        run_llm_batches(analyses)
+
+    for i, analysis in enumerate(analyses, 1):
+        article, guess = analysis["article"], analysis["guess"]
+        print(f"\n--- Analizzando {i}/{len(analyses)}: {article['title'][:60]}... ---")
+
+        if analysis["skip_llm_geo"]:
+            location_name = guess["location"]
+            lat, lon = guess["lat"], guess["lon"]
+            record_prefilter_result(prefilter_stats, article, guess, skipped=True)
+            print(f"  - Pre-classificatore: {location_name} (confidenza {guess['confidence']})")
+        else:
+            location_name, confidence = analysis.get("location_name"), analysis.get("confidence", 0.0)
+            if location_name is None:
+                location_name, confidence, geo_error = get_geolocation_for_article(article)
+            lat, lon = get_coordinates(location_name)
+            geo_model = OLLAMA_MODEL
+            LLM_STATS["geolocations"] += 1
+
+            # Cascata: solo i casi dubbi passano al modello grande, nella stessa esecuzione
+            reason = escalation_reason(location_name, confidence, lat, article)
+            if reason:
+                LLM_STATS["escalations"][reason] = LLM_STATS["escalations"].get(reason, 0) + 1
+                print(f"  - Escalation a {OLLAMA_MODEL_LARGE} ({reason}): {location_name}")
+                large_location, large_confidence, geo_error = get_geolocation_for_article(article, model=OLLAMA_MODEL_LARGE)
+                large_lat, large_lon = get_coordinates(large_location)
+                if large_lat is not None and large_lon is not None:
+                    location_name, confidence, lat, lon = large_location, large_confidence, large_lat, large_lon
+                    geo_model = OLLAMA_MODEL_LARGE
+            analysis["geo_model"] = geo_model
+            record_prefilter_result(prefilter_stats, article, guess, llm_location=location_name, llm_lat=lat, llm_lon=lon)
+
+        keywords = analysis.get("keywords")
+        if keywords is None:
+            keywords, kw_error = get_keywords_from_article(article)
+        icon_name, icon_error = find_best_icon_vector_search(keywords)
+
+        analysis.update({
+            "location_name": location_name, "lat": lat, "lon": lon,
+            "keywords": keywords, "icon_name": icon_name, "icon_url": build_icon_url(icon_name)
+        })
+    return analyses
 
 
 def get_coordinates(location_name):
@@ -251,6 +495,17 @@ def build_icon_url(icon_name):
          return f"{base_url}/{encoded_folder_name}/{asset_type_folder}/{asset_filename}"
 
 
+def build_news_item(analysis):
+    """Costruisce la voce pubblicata nello snapshot a partire dall'analisi di un articolo."""
+    article = analysis["article"]
+    return {
+        "lat": analysis["lat"], "lon": analysis["lon"], "title": article['title'],
+        "link": article["link"], "source": article["source"],
+        "timestamp": article["timestamp"], "icon_url": analysis["icon_url"],
+        "description": article.get('content', '')[:150] # Aggiunge descrizione
+    }
+
+
 def read_rss_feeds_from_file(file_path):
     """Legge un file di testo che contiene un dizionario di feed RSS."""
     try:
@@ -317,43 +572,83 @@ def create_report(stats, output_dir):
 - Icone trovate con successo: {stats['icon_success']}
 - Icone non trovate (usato fallback): {stats['icon_failed']}
 """
+    if 'llm_calls' in stats:
+        minutes = max(duration.total_seconds() / 60, 1e-9)
+        report_content += f"""---
+## Statistiche LLM
+- Dimensione massima del batch: {stats['batch_size']}
+- Chiamate LLM generative: {stats['llm_calls']}
+- Notizie analizzate al minuto: {stats['new_news'] / minutes:.1f}
+"""
+    if LLM_STATS["geolocations"]:
+        escalated = sum(LLM_STATS["escalations"].values())
+        report_content += "---\n## Statistiche Cascata\n"
+        report_content += f"- Escalation a {OLLAMA_MODEL_LARGE}: {escalated}/{LLM_STATS['geolocations']} ({escalated / LLM_STATS['geolocations']:.1%})\n"
+        for reason, count in sorted(LLM_STATS["escalations"].items(), key=lambda x: -x[1]):
+            report_content += f"  - {reason}: {count}\n"
+        # Latenza della sola geolocalizzazione per livello della cascata
+        for model in (OLLAMA_MODEL, OLLAMA_MODEL_LARGE):
+            geo_stats = LLM_STATS["models"].get(model, {}).get("geo")
+            if geo_stats:
+                report_content += f"- {model}: {geo_stats['calls']} geolocalizzazioni, latenza media {geo_stats['seconds'] / geo_stats['calls']:.1f} s\n"
+    if LLM_STATS["models"]:
+        report_content += "---\n## Latenze LLM per scopo\n"
+        for model, purposes in LLM_STATS["models"].items():
+            for purpose, call_stats in sorted(purposes.items()):
+                report_content += f"- {model} / {purpose}: {call_stats['calls']} chiamate, latenza media {call_stats['seconds'] / call_stats['calls']:.1f} s\n"
+    if 'prefilter' in stats:
+        report_content += "---\n## Statistiche Pre-classificatore\n" + "\n".join(summarize_prefilter(stats['prefilter'])) + "\n"
     with open(os.path.join(output_dir, "report.txt"), 'w', encoding='utf-8') as f:
         f.write(report_content)
 
-def update_manifest():
-    """
-    Scansiona la directory public/data nel repository clonato, genera un nuovo manifest
-    con i file JSON esistenti, lo ordina e lo limita.
-    """
-    print("Ricostruzione del manifest dai file esistenti...")
-    data_dir = os.path.join(REPO_LOCAL_PATH, "public/data")
-    
-    if not os.path.exists(data_dir):
-        print(f"La directory dei dati '{data_dir}' non esiste. Manifest non creato.")
-        return
+def publish_snapshot(geolocated_news, snapshot_name):
+    """Scrive uno snapshot nel repository clonato, ricostruisce il manifest e pubblica su GitHub."""
+    public_repo_dir = os.path.join(REPO_LOCAL_PATH, "public/data", snapshot_name)
+    os.makedirs(public_repo_dir, exist_ok=True)
+    geolocated_path = os.path.join(public_repo_dir, "notizie_geolocalizzate.json")
+    with open(geolocated_path, 'w', encoding='utf-8') as f:
+        json.dump(geolocated_news, f, indent=2, ensure_ascii=False)
+
+    # Copia indicizzata per le interrogazioni per area e periodo (news_archive.py)
+    try:
+        archived = archive_news(geolocated_news, snapshot=snapshot_name)
+        print(f"Archiviate {archived} notizie nell'archivio indicizzato.")
+    except sqlite3.Error as e:
+        print(f"Attenzione: impossibile aggiornare l'archivio indicizzato: {e}")
+
+    update_manifest()
+
+    # Feed incrementale per i client che si aggiornano senza riscaricare tutto il manifest
+    try:
+        publish_delta(geolocated_news, snapshot=snapshot_name)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Attenzione: impossibile aggiornare il feed incrementale: {e}")
+
+    # Sprite atlas delle icone nella finestra corrente: una sola immagine per il frontend
+    try:
+        build_icon_atlas()
+    except (OSError, ValueError) as e:
+        print(f"Attenzione: impossibile generare lo sprite atlas delle icone: {e}")
+
+    # Esegui il commit e push solo se sono state create nuove notizie
+    commit_and_push_changes()
+
+
+def load_processed_links():
+    processed_news_links = set()
+    if os.path.exists(PROCESSED_NEWS_TRACKER_FILE):
+        with open(PROCESSED_NEWS_TRACKER_FILE, 'r', encoding='utf-8') as f:
+            try:
+                processed_news_links = set(json.load(f))
+            except json.JSONDecodeError:
+                print("Attenzione: file tracker delle notizie processate corrotto.")
+    return processed_news_links
+
+
+def save_processed_links(processed_news_links):
+    with open(PROCESSED_NEWS_TRACKER_FILE, 'w', encoding='utf-8') as f:
+        json.dump(list(processed_news_links), f, indent=2)
 
-    # Trova tutti i file JSON nelle sottocartelle (che sono le timestamp)
-    all_news_files = []
-    for dirname in os.listdir(data_dir):
-        dirpath = os.path.join(data_dir, dirname)
-        if os.path.isdir(dirpath):
-            for filename in os.listdir(dirpath):
-                if filename.endswith(".json"):
-                    # Salva il percorso relativo, es: "data/2025-08-08.../file.json"
-                    relative_path = os.path.join("data", dirname, filename)
-                    all_news_files.append(relative_path)
-
-    # Ordina i file dal più recente al più vecchio basandosi sul nome della cartella
-    all_news_files.sort(key=lambda x: os.path.basename(os.path.dirname(x)), reverse=True)
-
-    # Limita il numero di voci nel manifest
-    max_entries = 100
-    manifest = all_news_files[:max_entries]
-
-    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
-        json.dump(manifest, f, indent=2)
-        
-    print(f"Manifest ricostruito e salvato con {len(manifest)} voci.")
 
 def manage_source_tracker():
     all_sources = read_rss_feeds_from_file("fonti.txt")
@@ -480,13 +775,7 @@ if __name__ == "__main__":
 
     start_time = datetime.now()
     
-    processed_news_links = set()
-    if os.path.exists(PROCESSED_NEWS_TRACKER_FILE):
-        with open(PROCESSED_NEWS_TRACKER_FILE, 'r', encoding='utf-8') as f:
-            try:
-                processed_news_links = set(json.load(f))
-            except json.JSONDecodeError:
-                print("Attenzione: file tracker delle notizie processate corrotto.")
+    processed_news_links = load_processed_links()
 
     source_to_process, source_name = manage_source_tracker()
     
@@ -508,52 +797,29 @@ if __name__ == "__main__":
             backend_output_dir = os.path.join("outputs", start_time.strftime('%Y-%m-%d_%H-%M-%S'))
             os.makedirs(backend_output_dir, exist_ok=True)
 
-            # La directory pubblica ora punta al repo clonato
-            public_repo_dir = os.path.join(REPO_LOCAL_PATH, "public/data", start_time.strftime('%Y-%m-%d_%H-%M-%S'))
-            os.makedirs(public_repo_dir, exist_ok=True)
-
             write_markdown_file(articles, os.path.join(backend_output_dir, "notizie.md"))
 
             geolocated_news = []
             failed_articles = []
             log_entries = []
             icon_success_count = 0
+            prefilter_stats = new_prefilter_stats()
             
             print("\nInizio processo di analisi...")
-            for i, article in enumerate(articles, 1):
-                title = article['title']
-                print(f"\n--- Analizzando {i}/{len(articles)}: {title[:60]}... ---")
-                log_line = f"NOTIZIA: {title}\n"
-                
-                location_name, geo_error = get_geolocation_for_article(article)
-                lat, lon = get_coordinates(location_name)
-                keywords, kw_error = get_keywords_from_article(article)
-                final_icon_name, icon_error = find_best_icon_vector_search(keywords)
-                icon_url = build_icon_url(final_icon_name)
-
-                log_entries.append(f"{log_line}  - Geoloc: {location_name}\n  - Icona: {final_icon_name}\n---\n")
+            for analysis in analyze_articles(articles, prefilter_stats):
+                article = analysis["article"]
+                lat, lon, final_icon_name = analysis["lat"], analysis["lon"], analysis["icon_name"]
+                log_entries.append(f"NOTIZIA: {article['title']}\n  - Geoloc: {analysis['location_name']}\n  - Icona: {final_icon_name}\n---\n")
 
                 if lat and lon:
                     if final_icon_name != DEFAULT_ICON: icon_success_count += 1
-                    geolocated_news.append({
-                        "lat": lat, "lon": lon, "title": title,
-                        "link": article["link"], "source": article["source"],
-                        "timestamp": article["timestamp"], "icon_url": icon_url,
-                        "description": article.get('content', '')[:150] # Aggiunge descrizione
-                    })
+                    geolocated_news.append(build_news_item(analysis))
                 else:
                     failed_articles.append(article)
             
             if geolocated_news:
-                geolocated_filename = "notizie_geolocalizzate.json"
-                geolocated_path = os.path.join(public_repo_dir, geolocated_filename)
-                with open(geolocated_path, 'w', encoding='utf-8') as f:
-                    json.dump(geolocated_news, f, indent=2, ensure_ascii=False)
-                
-                update_manifest()
-                
-                # Esegui il commit e push solo se sono state create nuove notizie
-                commit_and_push_changes()
+                # La directory pubblica punta al repo clonato
+                publish_snapshot(geolocated_news, start_time.strftime('%Y-%m-%d_%H-%M-%S'))
             else:
                 print("Nessuna notizia geolocalizzabile, nessun push su GitHub.")
 
@@ -567,13 +833,14 @@ if __name__ == "__main__":
                 'start_time': start_time, 'end_time': datetime.now(), 'source_name': source_name,
                 'total_news': len(articles_from_rss), 'new_news': len(articles),
                 'geoloc_success': len(geolocated_news), 'geoloc_failed': len(failed_articles),
-                'icon_success': icon_success_count, 'icon_failed': len(articles) - icon_success_count
+                'icon_success': icon_success_count, 'icon_failed': len(articles) - icon_success_count,
+                'prefilter': prefilter_stats, 'llm_calls': LLM_STATS['calls'], 'batch_size': LLM_BATCH_SIZE
             }
             create_report(stats, backend_output_dir)
+            write_prefilter_audit(prefilter_stats, backend_output_dir)
             
             processed_news_links.update({a['link'] for a in articles})
-            with open(PROCESSED_NEWS_TRACKER_FILE, 'w', encoding='utf-8') as f:
-                json.dump(list(processed_news_links), f, indent=2)
+            save_processed_links(processed_news_links)
 
             update_source_tracker(source_name)
 
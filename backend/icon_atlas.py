@@ -0,0 +1,164 @@
+import io
+import os
+import json
+import math
+import hashlib
+import requests
+from datetime import datetime, timedelta
+from PIL import Image
+
+# --- CONFIGURAZIONE ---
+REPO_LOCAL_PATH = "GloboNews_repo"
+PUBLIC_DIR = os.path.join(REPO_LOCAL_PATH, "public")
+MANIFEST_FILE = os.path.join(PUBLIC_DIR, "news_manifest.json")
+ATLAS_MAP_FILE = os.path.join(PUBLIC_DIR, "icon_atlas.json")
+ATLAS_DIR = os.path.join(PUBLIC_DIR, "icons")
+ATLAS_HISTORY_FILE = os.path.join(ATLAS_DIR, "history.json")
+ICON_CACHE_DIR = "icon_cache"
+ICON_CACHE_INDEX = os.path.join(ICON_CACHE_DIR, "index.json")
+USER_AGENT = "NotizIA-App/1.0"
+ATLAS_CELL = 64          # Lato in pixel di ogni icona nell'atlas (marker 40px, ticker 20px)
+WINDOW_HOURS = 48        # Stessa finestra mostrata dal frontend
+# Atlas pubblicati mantenuti su disco: la CDN può servire per qualche minuto una mappa
+# precedente, che deve ancora trovare la sua immagine
+ATLAS_KEEP = 3
+DEFAULT_ICON_URL = "https://raw.githubusercontent.com/microsoft/fluentui-emoji/main/assets/Newspaper/3D/newspaper_3d.png"
+
+
+def collect_window_icons(manifest_file=MANIFEST_FILE, public_dir=PUBLIC_DIR, hours=WINDOW_HOURS, now=None):
+    """Restituisce gli URL delle icone usate dalle notizie del manifest nella finestra temporale."""
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    threshold = (now or datetime.utcnow()) - timedelta(hours=hours)
+
+    icon_urls = {DEFAULT_ICON_URL: None}
+    for news_file in manifest:
+        try:
+            with open(os.path.join(public_dir, news_file), 'r', encoding='utf-8') as f:
+                news_items = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+        for item in news_items:
+            try:
+                timestamp = datetime.strptime(item.get("timestamp", ""), '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                continue
+            if timestamp > threshold and item.get("icon_url"):
+                icon_urls[item["icon_url"]] = None
+    # dict per deduplicare mantenendo l'ordine di inserimento
+    return list(icon_urls)
+
+
+def load_cache_index():
+    if os.path.exists(ICON_CACHE_INDEX):
+        with open(ICON_CACHE_INDEX, 'r', encoding='utf-8') as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                print("Attenzione: indice della cache delle icone corrotto, verrà ricreato.")
+    return {}
+
+
+def cache_icon(icon_url, cache_index):
+    """
+    Scarica un'icona una sola volta, la ridimensiona a ATLAS_CELL e la salva nella cache
+    con nome pari all'hash del contenuto. Restituisce il percorso locale o None.
+    """
+    cached_hash = cache_index.get(icon_url)
+    if cached_hash and os.path.exists(os.path.join(ICON_CACHE_DIR, f"{cached_hash}.png")):
+        return os.path.join(ICON_CACHE_DIR, f"{cached_hash}.png")
+
+    try:
+        response = requests.get(icon_url, headers={'User-Agent': USER_AGENT}, timeout=30)
+        response.raise_for_status()
+        image = Image.open(io.BytesIO(response.content)).convert("RGBA")
+    except (requests.exceptions.RequestException, OSError) as e:
+        print(f"  ! Impossibile scaricare l'icona {icon_url}: {e}")
+        return None
+
+    image.thumbnail((ATLAS_CELL, ATLAS_CELL), Image.LANCZOS)
+    cell = Image.new("RGBA", (ATLAS_CELL, ATLAS_CELL), (0, 0, 0, 0))
+    cell.paste(image, ((ATLAS_CELL - image.width) // 2, (ATLAS_CELL - image.height) // 2))
+    buffer = io.BytesIO()
+    cell.save(buffer, format="PNG", optimize=True)
+    content_hash = hashlib.sha256(buffer.getvalue()).hexdigest()[:16]
+
+    os.makedirs(ICON_CACHE_DIR, exist_ok=True)
+    cached_path = os.path.join(ICON_CACHE_DIR, f"{content_hash}.png")
+    with open(cached_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    cache_index[icon_url] = content_hash
+    return cached_path
+
+
+def build_icon_atlas(icon_urls=None):
+    """
+    Genera lo sprite atlas (WebP) delle icone in uso e la mappa url -> coordinate in
+    public/icon_atlas.json. Il nome del file dipende dal contenuto, quindi è cacheabile a lungo.
+    """
+    if icon_urls is None:
+        icon_urls = collect_window_icons()
+    cache_index = load_cache_index()
+    cells = []
+    for icon_url in icon_urls:
+        cached_path = cache_icon(icon_url, cache_index)
+        if cached_path:
+            cells.append((icon_url, cached_path))
+
+    os.makedirs(ICON_CACHE_DIR, exist_ok=True)
+    with open(ICON_CACHE_INDEX, 'w', encoding='utf-8') as f:
+        json.dump(cache_index, f, indent=2)
+
+    if not cells:
+        print("Nessuna icona disponibile per lo sprite atlas.")
+        return None
+
+    # Ordine stabile: lo stesso insieme di icone produce sempre lo stesso atlas
+    cells.sort(key=lambda cell: cache_index[cell[0]])
+    columns = math.ceil(math.sqrt(len(cells)))
+    rows = math.ceil(len(cells) / columns)
+    atlas = Image.new("RGBA", (columns * ATLAS_CELL, rows * ATLAS_CELL), (0, 0, 0, 0))
+    positions = {}
+    for index, (icon_url, cached_path) in enumerate(cells):
+        x, y = (index % columns) * ATLAS_CELL, (index // columns) * ATLAS_CELL
+        with Image.open(cached_path) as icon:
+            atlas.paste(icon, (x, y))
+        positions[icon_url] = [x, y]
+
+    atlas_hash = hashlib.sha256("".join(cache_index[url] for url, _ in cells).encode('utf-8')).hexdigest()[:16]
+    atlas_filename = f"atlas_{atlas_hash}.webp"
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    atlas_path = os.path.join(ATLAS_DIR, atlas_filename)
+    if not os.path.exists(atlas_path):
+        atlas.save(atlas_path, format="WEBP", quality=90, method=6)
+
+    # Mantiene gli ultimi ATLAS_KEEP atlas pubblicati (dal più recente) e rimuove gli altri.
+    # L'ordine viene da history.json e non dalle date dei file, che un nuovo clone azzera.
+    try:
+        with open(ATLAS_HISTORY_FILE, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        history = []
+    history = [atlas_filename] + [name for name in history if name != atlas_filename]
+    kept = history[:ATLAS_KEEP]
+    for filename in os.listdir(ATLAS_DIR):
+        if filename.startswith("atlas_") and filename not in kept:
+            os.remove(os.path.join(ATLAS_DIR, filename))
+    with open(ATLAS_HISTORY_FILE, 'w', encoding='utf-8') as f:
+        json.dump(kept, f, indent=2)
+
+    atlas_map = {
+        "image": f"icons/{atlas_filename}",
+        "cell": ATLAS_CELL,
+        "width": atlas.width,
+        "height": atlas.height,
+        "icons": positions,
+    }
+    with open(ATLAS_MAP_FILE, 'w', encoding='utf-8') as f:
+        json.dump(atlas_map, f, indent=2)
+    print(f"Sprite atlas '{atlas_filename}' generato con {len(positions)} icone ({atlas.width}x{atlas.height}px).")
+    return atlas_map
+
+
+if __name__ == "__main__":
+    build_icon_atlas()
@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import requests
+import chromadb
+import numpy as np
+from tqdm import tqdm
+
+# --- CONFIGURAZIONE ---
+OLLAMA_URL = "http://localhost:11434/api/embeddings"
+EMBEDDING_MODEL = "nomic-embed-text"
+ASSETS_FILE = "assets_structure.json"
+DB_PATH = "icon_db"
+COLLECTION_NAME = "fluent_icons"
+# Durante una ricostruzione si indicizza in una collezione separata, poi si scambiano i nomi:
+# chi usa la collezione vede quella vecchia finché la nuova non è completa
+REBUILD_COLLECTION_NAME = f"{COLLECTION_NAME}_rebuild"
+PREVIOUS_COLLECTION_NAME = f"{COLLECTION_NAME}_previous"
+PAGE_SIZE = 200     # Elementi letti per pagina dalla collezione
+UPSERT_BATCH = 64   # Embedding scritti per batch durante la sincronizzazione
+
+
+def get_embedding(text, model=EMBEDDING_MODEL):
+    """
+    Ottiene l'embedding per un dato testo usando il modello specificato in Ollama.
+    """
+    try:
+        response = requests.post(
+            OLLAMA_URL,
+            json={"model": model, "prompt": text},
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json().get("embedding")
+    except requests.exceptions.RequestException as e:
+        print(f"\nErrore di connessione a Ollama: {e}")
+        return None
+    except Exception as e:
+        print(f"\nErrore imprevisto durante la generazione dell'embedding: {e}")
+        return None
+
+
+def text_hash(text, model=EMBEDDING_MODEL):
+    """Impronta del testo indicizzato: cambia se cambiano il testo o il modello di embedding."""
+    return hashlib.sha256(f"{model}\n{text}".encode('utf-8')).hexdigest()
+
+
+def load_icon_texts():
+    """Restituisce {id_icona: testo da indicizzare} a partire da assets_structure.json."""
+    with open(ASSETS_FILE, 'r', encoding='utf-8') as f:
+        asset_structure = json.load(f)
+    # Il testo indicizzato è il nome dell'icona, come nella ricerca di geoloc_fetcher.py
+    return {name: name for name in asset_structure.keys()}
+
+
+def iter_collection(collection, include=("documents", "metadatas"), page_size=PAGE_SIZE, offset=0, limit=None):
+    """Scorre la collezione a pagine, senza caricare tutti gli elementi in memoria."""
+    yielded = 0
+    while limit is None or yielded < limit:
+        batch_size = page_size if limit is None else min(page_size, limit - yielded)
+        page = collection.get(include=list(include), limit=batch_size, offset=offset)
+        if not page['ids']:
+            return
+        for i, item_id in enumerate(page['ids']):
+            item = {"id": item_id}
+            for field in include:
+                values = page.get(field)
+                item[field] = values[i] if values is not None else None
+            yield item
+        yielded += len(page['ids'])
+        offset += len(page['ids'])
+
+
+def get_existing_collection(client, name):
+    try:
+        return client.get_collection(name=name)
+    except Exception:
+        return None
+
+
+def open_collection(client, model=EMBEDDING_MODEL):
+    """
+    Apre la collezione delle icone. Restituisce (collezione, ricostruzione): se la collezione
+    è stata costruita con un altro modello di embedding (dimensione dei vettori diversa), si
+    indicizza in REBUILD_COLLECTION_NAME, da scambiare con swap_rebuilt_collection a fine lavoro.
+    """
+    # Il metadata viene passato solo alla creazione: con get_or_create alcune versioni di
+    # chromadb lo sovrascrivono e il cambio di modello non verrebbe mai rilevato
+    collection = get_existing_collection(client, COLLECTION_NAME)
+    if collection is None:
+        return client.create_collection(name=COLLECTION_NAME, metadata={"embedding_model": model}), False
+    stored_model = (collection.metadata or {}).get("embedding_model")
+    if stored_model == model:
+        return collection, False
+
+    if stored_model:
+        print(f"Modello di embedding cambiato ('{stored_model}' -> '{model}'): la collezione verrà ricostruita.")
+    else:
+        print("La collezione non registra il modello di embedding usato: verrà ricostruita.")
+    rebuild = get_existing_collection(client, REBUILD_COLLECTION_NAME)
+    if rebuild is not None and (rebuild.metadata or {}).get("embedding_model") == model:
+        # Ricostruzione interrotta in precedenza: riprende dagli embedding già calcolati
+        print(f"Riprendo la ricostruzione in '{REBUILD_COLLECTION_NAME}' ({rebuild.count()} elementi già indicizzati).")
+        return rebuild, True
+    if rebuild is not None:
+        client.delete_collection(name=REBUILD_COLLECTION_NAME)
+    return client.create_collection(name=REBUILD_COLLECTION_NAME, metadata={"embedding_model": model}), True
+
+
+def swap_rebuilt_collection(client):
+    """
+    Mette in servizio la collezione ricostruita. La precedente resta come PREVIOUS_COLLECTION_NAME
+    fino alla ricostruzione successiva, così un processo che la sta usando non si interrompe.
+    """
+    if get_existing_collection(client, PREVIOUS_COLLECTION_NAME) is not None:
+        client.delete_collection(name=PREVIOUS_COLLECTION_NAME)
+    client.get_collection(name=COLLECTION_NAME).modify(name=PREVIOUS_COLLECTION_NAME)
+    collection = client.get_collection(name=REBUILD_COLLECTION_NAME)
+    collection.modify(name=COLLECTION_NAME)
+    print(f"Collezione ricostruita messa in servizio come '{COLLECTION_NAME}'.")
+    return collection
+
+
+def sync_index(dry_run=False, model=EMBEDDING_MODEL):
+    """
+    Allinea la collezione ad assets_structure.json: aggiunge le icone nuove, rimuove quelle
+    cancellate e ricalcola l'embedding di quelle il cui testo o modello è cambiato.
+    """
+    if not os.path.exists(ASSETS_FILE):
+        print(f"ERRORE: File '{ASSETS_FILE}' non trovato. Impossibile procedere.")
+        return
+
+    try:
+        desired = load_icon_texts()
+        print(f"Trovati {len(desired)} nomi di icone in '{ASSETS_FILE}'.")
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"ERRORE: Impossibile leggere o parsare '{ASSETS_FILE}': {e}")
+        return
+
+    print(f"Inizializzazione del database vettoriale in '{DB_PATH}'...")
+    client = chromadb.PersistentClient(path=DB_PATH)
+    if dry_run:
+        try:
+            collection = client.get_collection(name=COLLECTION_NAME)
+        except Exception:
+            print(f"La collezione '{COLLECTION_NAME}' non esiste: tutte le {len(desired)} icone verrebbero aggiunte.")
+            return
+        if (collection.metadata or {}).get("embedding_model") != model:
+            print(f"Modello di embedding diverso: tutte le {len(desired)} icone verrebbero reindicizzate.")
+            return
+    else:
+        collection, rebuilding = open_collection(client, model)
+
+    existing = {
+        item["id"]: (item["metadatas"] or {}).get("text_hash")
+        for item in iter_collection(collection, include=("metadatas",))
+    }
+    to_remove = sorted(set(existing) - set(desired))
+    to_add = sorted(set(desired) - set(existing))
+    to_update = sorted(
+        icon_id for icon_id in set(desired) & set(existing)
+        if existing[icon_id] != text_hash(desired[icon_id], model)
+    )
+    print(f"Differenze: {len(to_add)} da aggiungere, {len(to_update)} da reindicizzare, {len(to_remove)} da rimuovere.")
+
+    if dry_run:
+        return
+    if not (to_add or to_update or to_remove):
+        if rebuilding:
+            swap_rebuilt_collection(client)
+        else:
+            print("Il database è già aggiornato.")
+        return
+
+    for start in range(0, len(to_remove), PAGE_SIZE):
+        collection.delete(ids=to_remove[start:start + PAGE_SIZE])
+
+    # Scrive a piccoli batch: un'interruzione lascia il database coerente e riprende dal punto giusto
+    pending = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+    failed = 0
+    for icon_id in tqdm(to_add + to_update, desc="Generazione Embeddings"):
+        text = desired[icon_id]
+        embedding = get_embedding(text, model)
+        if not embedding:
+            failed += 1
+            continue
+        pending["ids"].append(icon_id)
+        pending["embeddings"].append(embedding)
+        pending["documents"].append(text)
+        pending["metadatas"].append({"text_hash": text_hash(text, model)})
+        if len(pending["ids"]) >= UPSERT_BATCH:
+            collection.upsert(**pending)
+            pending = {key: [] for key in pending}
+    if pending["ids"]:
+        collection.upsert(**pending)
+
+    if failed:
+        print(f"Attenzione: {failed} icone saltate per errori di embedding (verranno riprovate alla prossima sincronizzazione).")
+    if rebuilding:
+        if failed:
+            # Una collezione incompleta non sostituisce quella in uso
+            print(f"La ricostruzione resta in '{REBUILD_COLLECTION_NAME}' e verrà completata alla prossima sincronizzazione.")
+            return
+        collection = swap_rebuilt_collection(client)
+    print(f"\nProcesso completato. La collezione '{COLLECTION_NAME}' contiene ora {collection.count()} elementi.")
+
+
+def export_index(output_path, include_embeddings=False):
+    """Esporta la collezione in formato JSONL, una pagina alla volta."""
+    collection = chromadb.PersistentClient(path=DB_PATH).get_collection(name=COLLECTION_NAME)
+    include = ("documents", "metadatas", "embeddings") if include_embeddings else ("documents", "metadatas")
+    out = sys.stdout if output_path == "-" else open(output_path, 'w', encoding='utf-8')
+    count = 0
+    try:
+        for item in iter_collection(collection, include=include):
+            if include_embeddings and item.get("embeddings") is not None:
+                item["embeddings"] = [float(x) for x in item["embeddings"]]
+            out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Esportati {count} elementi.", file=sys.stderr)
+
+
+def inspect_index(page=1, page_size=50):
+    """Mostra una pagina della collezione con i metadati."""
+    collection = chromadb.PersistentClient(path=DB_PATH).get_collection(name=COLLECTION_NAME)
+    total = collection.count()
+    pages = max(1, -(-total // page_size))
+    print(f"Collezione '{COLLECTION_NAME}': {total} elementi, modello '{(collection.metadata or {}).get('embedding_model')}'.")
+    print(f"Pagina {page}/{pages}:\n")
+    for item in iter_collection(collection, offset=(page - 1) * page_size, limit=page_size, page_size=page_size):
+        text_hash_short = ((item["metadatas"] or {}).get("text_hash") or "-")[:12]
+        print(f"ID: {item['id']}, Document: {item['documents']}, Hash: {text_hash_short}")
+
+
+def query_index(text, n_results=5):
+    """Cerca le icone più vicine a un testo libero, come fa la pipeline con le parole chiave."""
+    collection = chromadb.PersistentClient(path=DB_PATH).get_collection(name=COLLECTION_NAME)
+    embedding = get_embedding(text, (collection.metadata or {}).get("embedding_model", EMBEDDING_MODEL))
+    if not embedding:
+        return
+    results = collection.query(query_embeddings=[embedding], n_results=n_results)
+    print(f"Icone più vicine a '{text}':")
+    for rank, (icon_id, distance) in enumerate(zip(results['ids'][0], results['distances'][0]), 1):
+        print(f"  {rank}. {icon_id} (distanza {distance:.4f})")
+
+
+def exact_distances(matrix, queries, space):
+    """Distanze esatte con la stessa metrica usata dall'indice HNSW di Chroma."""
+    if space == "cosine":
+        matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        return 1.0 - queries @ matrix.T
+    if space == "ip":
+        return 1.0 - queries @ matrix.T
+    # l2 (default di Chroma): distanza euclidea al quadrato
+    return (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ matrix.T + (matrix ** 2).sum(axis=1)[None, :]
+
+
+def benchmark_index(n_queries=200, k=10, noise=0.05, seed=42):
+    """
+    Confronta la ricerca approssimata HNSW di Chroma con la ricerca esatta su tutte le icone:
+    recall@k e latenza per query. Le query sono embedding di icone perturbati con rumore gaussiano.
+    """
+    collection = chromadb.PersistentClient(path=DB_PATH).get_collection(name=COLLECTION_NAME)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+
+    ids, vectors = [], []
+    for item in iter_collection(collection, include=("embeddings",)):
+        ids.append(item["id"])
+        vectors.append(item["embeddings"])
+    if not ids:
+        print("La collezione è vuota.")
+        return
+    matrix = np.asarray(vectors, dtype=np.float32)
+    k = min(k, len(ids))
+    print(f"Benchmark su {len(ids)} icone (dimensione {matrix.shape[1]}, metrica {space}), {n_queries} query, k={k}.")
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False)
+    scale = noise * np.linalg.norm(matrix, axis=1).mean() / np.sqrt(matrix.shape[1])
+    queries = matrix[sample] + rng.normal(0.0, scale, size=(len(sample), matrix.shape[1])).astype(np.float32)
+
+    exact_latencies, hnsw_latencies, recalls = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        distances = exact_distances(matrix, query[None, :], space)[0]
+        exact_top = {ids[i] for i in np.argpartition(distances, k - 1)[:k]}
+        exact_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        hnsw_latencies.append(time.perf_counter() - start)
+        recalls.append(len(exact_top & set(result['ids'][0])) / k)
+
+    def percentiles(values):
+        values_ms = np.asarray(values) * 1000
+        return f"p50 {np.percentile(values_ms, 50):.2f} ms, p95 {np.percentile(values_ms, 95):.2f} ms"
+
+    print(f"Recall@{k} HNSW: media {np.mean(recalls):.4f}, minima {np.min(recalls):.4f}")
+    print(f"Latenza HNSW (Chroma): {percentiles(hnsw_latencies)}")
+    print(f"Latenza ricerca esatta (numpy): {percentiles(exact_latencies)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestione del database vettoriale delle icone.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Sincronizza la collezione con assets_structure.json")
+    sync_parser.add_argument("--dry-run", action="store_true", help="Mostra solo le differenze")
+
+    export_parser = subparsers.add_parser("export", help="Esporta la collezione in JSONL")
+    export_parser.add_argument("output", nargs="?", default="-", help="File di destinazione ('-' per stdout)")
+    export_parser.add_argument("--embeddings", action="store_true", help="Include i vettori")
+
+    inspect_parser = subparsers.add_parser("inspect", help="Mostra una pagina della collezione")
+    inspect_parser.add_argument("--page", type=int, default=1)
+    inspect_parser.add_argument("--page-size", type=int, default=50)
+
+    query_parser = subparsers.add_parser("query", help="Cerca le icone più vicine a un testo")
+    query_parser.add_argument("text")
+    query_parser.add_argument("-n", type=int, default=5, help="Numero di risultati")
+
+    bench_parser = subparsers.add_parser("bench", help="Recall e latenza di HNSW rispetto alla ricerca esatta")
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("-k", type=int, default=10)
+    bench_parser.add_argument("--noise", type=float, default=0.05, help="Rumore relativo aggiunto alle query")
+    bench_parser.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args()
+    if args.command == "sync":
+        sync_index(dry_run=args.dry_run)
+    elif args.command == "export":
+        export_index(args.output, include_embeddings=args.embeddings)
+    elif args.command == "inspect":
+        inspect_index(page=args.page, page_size=args.page_size)
+    elif args.command == "query":
+        query_index(args.text, n_results=args.n)
+    elif args.command == "bench":
+        benchmark_index(n_queries=args.queries, k=args.k, noise=args.noise, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
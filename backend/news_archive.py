@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import calendar
+import argparse
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURAZIONE ---
+ARCHIVE_DB_FILE = "news_archive.sqlite"
+ARCHIVE_HOST = "0.0.0.0"
+ARCHIVE_PORT = 8766
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# ts delle notizie senza data valida: un valore fisso (e non NULL) permette di ordinare
+# e paginare direttamente sull'indice (ts, id)
+MISSING_TS = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    title TEXT,
+    source TEXT,
+    icon_url TEXT,
+    description TEXT,
+    timestamp TEXT,
+    ts INTEGER NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    snapshot TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_news_ts ON news(ts, id);
+CREATE INDEX IF NOT EXISTS idx_news_source ON news(source, ts);
+CREATE INDEX IF NOT EXISTS idx_news_icon ON news(icon_url);
+CREATE VIRTUAL TABLE IF NOT EXISTS news_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def open_archive(path=ARCHIVE_DB_FILE):
+    """Apre (creandolo se serve) l'archivio indicizzato delle notizie."""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def open_reader(path=ARCHIVE_DB_FILE):
+    """Connessione di sola lettura per il servizio HTTP: lo schema è già creato da serve_archive."""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def parse_timestamp(value):
+    """
+    Converte un timestamp in secondi epoch (UTC). Accetta il formato delle notizie,
+    date ISO ("2025-08-10", "2025-08-10T12:00:00") o un numero; None se non valido.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(value)
+    for parser in (lambda v: datetime.strptime(v, TIMESTAMP_FORMAT), datetime.fromisoformat):
+        try:
+            parsed = parser(str(value))
+            break
+        except ValueError:
+            continue
+    else:
+        return None
+    if parsed.tzinfo is not None:
+        return int(parsed.timestamp())
+    # I timestamp delle notizie derivano da published_parsed di feedparser, cioè UTC
+    return calendar.timegm(parsed.timetuple())
+
+
+def parse_item_ts(item):
+    ts = parse_timestamp(item.get('timestamp'))
+    return MISSING_TS if ts is None else ts
+
+
+def get_version(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    return int(row['value']) if row else 0
+
+
+def insert_news(conn, news_items, snapshot=None):
+    """
+    Inserisce (o aggiorna, per link) le notizie geolocalizzate nell'archivio e nell'indice R-tree.
+    Restituisce il numero di notizie scritte.
+    """
+    written = 0
+    with conn:
+        for item in news_items:
+            if item.get('lat') is None or item.get('lon') is None or not item.get('link'):
+                continue
+            conn.execute(
+                """INSERT INTO news (link, title, source, icon_url, description, timestamp, ts, lat, lon, snapshot)
+                   VALUES (:link, :title, :source, :icon_url, :description, :timestamp, :ts, :lat, :lon, :snapshot)
+                   ON CONFLICT(link) DO UPDATE SET
+                       title = excluded.title, source = excluded.source, icon_url = excluded.icon_url,
+                       description = excluded.description, timestamp = excluded.timestamp, ts = excluded.ts,
+                       lat = excluded.lat, lon = excluded.lon, snapshot = excluded.snapshot""",
+                {
+                    "link": item['link'], "title": item.get('title'), "source": item.get('source'),
+                    "icon_url": item.get('icon_url'), "description": item.get('description'),
+                    "timestamp": item.get('timestamp'), "ts": parse_item_ts(item),
+                    "lat": float(item['lat']), "lon": float(item['lon']), "snapshot": snapshot,
+                }
+            )
+            news_id = conn.execute("SELECT id FROM news WHERE link = ?", (item['link'],)).fetchone()['id']
+            lat, lon = float(item['lat']), float(item['lon'])
+            conn.execute(
+                "INSERT OR REPLACE INTO news_rtree (id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)",
+                (news_id, lat, lat, lon, lon)
+            )
+            written += 1
+        # La versione cambia a ogni scrittura e invalida gli ETag delle risposte precedenti
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('version', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (str(get_version(conn) + 1),)
+        )
+    return written
+
+
+def archive_news(news_items, snapshot=None, path=ARCHIVE_DB_FILE):
+    """Scrive nell'archivio le notizie di uno snapshot appena pubblicato."""
+    conn = open_archive(path)
+    try:
+        return insert_news(conn, news_items, snapshot)
+    finally:
+        conn.close()
+
+
+def import_snapshots(data_dir, path=ARCHIVE_DB_FILE):
+    """Importa nell'archivio tutte le cartelle di snapshot esistenti (es. public/data)."""
+    conn = open_archive(path)
+    total = 0
+    try:
+        for dirname in sorted(os.listdir(data_dir)):
+            snapshot_file = os.path.join(data_dir, dirname, "notizie_geolocalizzate.json")
+            if not os.path.isfile(snapshot_file):
+                continue
+            try:
+                with open(snapshot_file, 'r', encoding='utf-8') as f:
+                    news_items = json.load(f)
+            except json.JSONDecodeError:
+                print(f"  ! JSON non valido in '{snapshot_file}', saltato.")
+                continue
+            total += insert_news(conn, news_items, snapshot=dirname)
+        print(f"Importate {total} notizie da '{data_dir}'. L'archivio contiene {conn.execute('SELECT COUNT(*) FROM news').fetchone()[0]} notizie.")
+    finally:
+        conn.close()
+    return total
+
+
+def parse_bbox(value):
+    """Legge un bbox "min_lon,min_lat,max_lon,max_lat"; min_lon > max_lon indica l'antimeridiano."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("il bbox deve avere 4 valori: min_lon,min_lat,max_lon,max_lat")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if min_lat > max_lat:
+        raise ValueError("min_lat maggiore di max_lat")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def query_news(conn, bbox=None, start=None, end=None, source=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Restituisce le notizie nel bbox e nella finestra temporale, dalla più recente, a pagine.
+    Il cursore ("ts:id") è quello restituito dalla pagina precedente.
+    """
+    clauses, params = [], []
+    joins = ""
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        joins = "JOIN news_rtree r ON r.id = n.id"
+        clauses.append("r.min_lat >= ? AND r.max_lat <= ?")
+        params += [min_lat, max_lat]
+        if min_lon <= max_lon:
+            clauses.append("r.min_lon >= ? AND r.max_lon <= ?")
+            params += [min_lon, max_lon]
+        else:
+            clauses.append("(r.min_lon >= ? OR r.max_lon <= ?)")
+            params += [min_lon, max_lon]
+    if start is not None:
+        clauses.append("n.ts >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("n.ts <= ? AND n.ts > ?")
+        params += [end, MISSING_TS]
+    if source:
+        clauses.append("n.source = ?")
+        params.append(source)
+    if cursor:
+        cursor_ts, cursor_id = (int(p) for p in cursor.split(":"))
+        clauses.append("(n.ts < ? OR (n.ts = ? AND n.id < ?))")
+        params += [cursor_ts, cursor_ts, cursor_id]
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"""SELECT n.id, n.lat, n.lon, n.title, n.link, n.source, n.timestamp, n.icon_url, n.description, n.ts
+            FROM news n {joins} {where}
+            ORDER BY n.ts DESC, n.id DESC LIMIT ?""",
+        params + [limit + 1]
+    ).fetchall()
+
+    items = [
+        {key: row[key] for key in ("lat", "lon", "title", "link", "source", "timestamp", "icon_url", "description")}
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = f"{last['ts']}:{last['id']}"
+    return items, next_cursor
+
+
+# --- SERVIZIO HTTP ---
+def parse_time_param(value, name):
+    """Legge un parametro temporale: assente va bene, non interpretabile è un errore."""
+    ts = parse_timestamp(value)
+    if value and ts is None:
+        raise ValueError(f"'{name}' non è una data valida: {value}")
+    return ts
+
+
+class ArchiveRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /news?bbox=min_lon,min_lat,max_lon,max_lat&from=...&to=...&source=...&limit=...&cursor=...
+    Le risposte hanno un ETag legato alla versione dell'archivio: If-None-Match restituisce 304.
+    """
+
+    def _send_json(self, status, payload, etag=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "public, max-age=60")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/news":
+            self._send_json(404, {"error": "Endpoint non trovato"})
+            return
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            bbox = parse_bbox(params["bbox"]) if params.get("bbox") else None
+            start = parse_time_param(params.get("from"), "from")
+            end = parse_time_param(params.get("to"), "to")
+            limit = max(1, min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+            cursor = params.get("cursor")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Parametri non validi: {e}"})
+            return
+
+        conn = open_reader(self.server.archive_path)
+        try:
+            version = get_version(conn)
+            query_key = json.dumps(sorted(params.items()))
+            etag = '"' + hashlib.sha1(f"{version}|{query_key}".encode('utf-8')).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                return
+            try:
+                items, next_cursor = query_news(conn, bbox, start, end, params.get("source"), limit, cursor)
+            except ValueError as e:
+                self._send_json(400, {"error": f"Cursore non valido: {e}"})
+                return
+            self._send_json(200, {"items": items, "next_cursor": next_cursor, "count": len(items)}, etag=etag)
+        finally:
+            conn.close()
+
+
+def serve_archive(host=ARCHIVE_HOST, port=ARCHIVE_PORT, path=ARCHIVE_DB_FILE):
+    # Schema e modalità WAL una sola volta all'avvio; le richieste usano solo connessioni in lettura
+    open_archive(path).close()
+    server = ThreadingHTTPServer((host, port), ArchiveRequestHandler)
+    server.archive_path = path
+    print(f"Archivio '{path}' servito su http://{host}:{port}/news")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServizio interrotto dall'utente.")
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivio indicizzato delle notizie geolocalizzate.")
+    parser.add_argument("--db", default=ARCHIVE_DB_FILE, help="File SQLite dell'archivio")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Importa le cartelle di snapshot esistenti")
+    import_parser.add_argument("data_dir", nargs="?", default=os.path.join("..", "public", "data"))
+
+    serve_parser = subparsers.add_parser("serve", help="Avvia il servizio HTTP di interrogazione")
+    serve_parser.add_argument("--host", default=ARCHIVE_HOST)
+    serve_parser.add_argument("--port", type=int, default=ARCHIVE_PORT)
+
+    query_parser = subparsers.add_parser("query", help="Interroga l'archivio da riga di comando")
+    query_parser.add_argument("--bbox", help="min_lon,min_lat,max_lon,max_lat")
+    query_parser.add_argument("--from", dest="start")
+    query_parser.add_argument("--to", dest="end")
+    query_parser.add_argument("--source")
+    query_parser.add_argument("--limit", type=int, default=20)
+    query_parser.add_argument("--cursor", help="Cursore 'ts:id' stampato dalla pagina precedente")
+
+    args = parser.parse_args()
+    if args.command == "import":
+        start_time = time.time()
+        import_snapshots(args.data_dir, args.db)
+        print(f"Import completato in {time.time() - start_time:.1f} secondi.")
+    elif args.command == "serve":
+        serve_archive(args.host, args.port, args.db)
+    elif args.command == "query":
+        try:
+            bbox = parse_bbox(args.bbox) if args.bbox else None
+            start, end = parse_time_param(args.start, "--from"), parse_time_param(args.end, "--to")
+        except ValueError as e:
+            print(f"ERRORE: parametri non validi: {e}")
+            return
+        conn = open_archive(args.db)
+        try:
+            items, next_cursor = query_news(conn, bbox, start, end, args.source, args.limit, args.cursor)
+        except ValueError as e:
+            print(f"ERRORE: cursore non valido: {e}")
+            return
+        finally:
+            conn.close()
+        for item in items:
+            print(f"{item['timestamp']} [{item['source']}] ({item['lat']:.3f}, {item['lon']:.3f}) {item['title']}")
+        print(f"\n{len(items)} notizie" + (f", cursore successivo: {next_cursor}" if next_cursor else "."))
+
+
+if __name__ == "__main__":
+    main()
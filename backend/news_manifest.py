@@ -0,0 +1,43 @@
+import os
+import json
+
+# --- CONFIGURAZIONE ---
+REPO_LOCAL_PATH = "GloboNews_repo"
+DATA_DIR = os.path.join(REPO_LOCAL_PATH, "public/data")
+# Il manifest si trova nel repo clonato
+MANIFEST_FILE = os.path.join(REPO_LOCAL_PATH, "public/news_manifest.json")
+
+
+def update_manifest(data_dir=DATA_DIR, manifest_file=MANIFEST_FILE):
+    """
+    Scansiona la directory public/data nel repository clonato, genera un nuovo manifest
+    con i file JSON esistenti, lo ordina e lo limita.
+    """
+    print("Ricostruzione del manifest dai file esistenti...")
+    
+    if not os.path.exists(data_dir):
+        print(f"La directory dei dati '{data_dir}' non esiste. Manifest non creato.")
+        return
+
+    # Trova tutti i file JSON nelle sottocartelle (che sono le timestamp)
+    all_news_files = []
+    for dirname in os.listdir(data_dir):
+        dirpath = os.path.join(data_dir, dirname)
+        if os.path.isdir(dirpath):
+            for filename in os.listdir(dirpath):
+                if filename.endswith(".json"):
+                    # Salva il percorso relativo, es: "data/2025-08-08.../file.json"
+                    relative_path = os.path.join("data", dirname, filename)
+                    all_news_files.append(relative_path)
+
+    # Ordina i file dal più recente al più vecchio basandosi sul nome della cartella
+    all_news_files.sort(key=lambda x: os.path.basename(os.path.dirname(x)), reverse=True)
+
+    # Limita il numero di voci nel manifest
+    max_entries = 100
+    manifest = all_news_files[:max_entries]
+
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        
+    print(f"Manifest ricostruito e salvato con {len(manifest)} voci.")
@@ -0,0 +1,362 @@
+import os
+import json
+import time
+import random
+import calendar
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from news_manifest import update_manifest
+from news_archive import open_archive, import_snapshots, archive_news, query_news, parse_timestamp
+from delta_feed import publish_delta, load_state, load_current_items
+
+# --- CONFIGURAZIONE ---
+SOURCE_DATA_DIR = os.path.join("..", "public", "data")   # Corpus reale usato come modello
+FRONTEND_LAYOUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "news_layout.js")
+SNAPSHOT_FILENAME = "notizie_geolocalizzate.json"
+SNAPSHOT_DIR_FORMAT = '%Y-%m-%d_%H-%M-%S'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+WINDOW_HOURS = 48           # Finestra mostrata dal frontend
+MAX_PUBLISH_DELAY_HOURS = 6 # Ritardo massimo tra pubblicazione della notizia e snapshot
+JITTER_DEGREES = 0.5        # Dispersione delle notizie non assegnate al centroide esatto
+
+# Harness per node: carica il manifest come fa il frontend, poi filtra e raggruppa
+NODE_HARNESS = """
+const fs = require('fs');
+const path = require('path');
+const { filterRecentNews, clusterNews } = require(process.argv[1]);
+const publicDir = process.argv[2];
+const now = Number(process.argv[3]);
+const repeat = Number(process.argv[4]);
+const ms = (start) => Number(process.hrtime.bigint() - start) / 1e6;
+
+const timings = { load: [], filter: [], cluster: [] };
+let counts = {};
+for (let i = 0; i < repeat; i++) {
+    let start = process.hrtime.bigint();
+    const manifest = JSON.parse(fs.readFileSync(path.join(publicDir, 'news_manifest.json'), 'utf8'));
+    const allNews = manifest.map(f => JSON.parse(fs.readFileSync(path.join(publicDir, f), 'utf8'))).flat();
+    timings.load.push(ms(start));
+
+    start = process.hrtime.bigint();
+    const recentNews = filterRecentNews(allNews, 48, now);
+    timings.filter.push(ms(start));
+
+    start = process.hrtime.bigint();
+    const finalNewsData = clusterNews(recentNews);
+    timings.cluster.push(ms(start));
+
+    const groups = new Set(recentNews.map(d => `${d.lat.toFixed(3)},${d.lon.toFixed(3)}`));
+    counts = { files: manifest.length, all: allNews.length, recent: recentNews.length,
+               markers: finalNewsData.length, groups: groups.size };
+}
+console.log(JSON.stringify({ timings, counts }));
+"""
+
+
+# --- GENERAZIONE ---
+def load_templates(source_dir=SOURCE_DATA_DIR):
+    """Legge le notizie reali da usare come modello (titoli, fonti, icone, coordinate)."""
+    templates = []
+    for dirname in sorted(os.listdir(source_dir)):
+        snapshot_file = os.path.join(source_dir, dirname, SNAPSHOT_FILENAME)
+        if not os.path.isfile(snapshot_file):
+            continue
+        try:
+            with open(snapshot_file, 'r', encoding='utf-8') as f:
+                templates.extend(item for item in json.load(f) if item.get('lat') is not None and item.get('lon') is not None)
+        except json.JSONDecodeError:
+            print(f"  ! JSON non valido in '{snapshot_file}', saltato.")
+    return templates
+
+
+def build_hotspots(templates, skew):
+    """
+    Centroidi reali ordinati per frequenza con pesi Zipf 1/rank^skew:
+    skew 0 distribuisce uniformemente, valori alti concentrano le notizie su pochi luoghi.
+    """
+    counts = {}
+    for item in templates:
+        key = (item['lat'], item['lon'])
+        counts[key] = counts.get(key, 0) + 1
+    hotspots = sorted(counts, key=counts.get, reverse=True)
+    weights = [1 / (rank + 1) ** skew for rank in range(len(hotspots))]
+    return hotspots, weights
+
+
+def generate_dataset(output_dir, articles, days, snapshots_per_day, skew, exact_share,
+                     source_dir=SOURCE_DATA_DIR, end=None, seed=42):
+    """
+    Crea in output_dir/public/data cartelle di snapshot con lo stesso schema di
+    notizie_geolocalizzate.json. Restituisce il numero di snapshot scritti.
+    """
+    rng = random.Random(seed)
+    templates = load_templates(source_dir)
+    if not templates:
+        raise ValueError(f"Nessuna notizia di riferimento in '{source_dir}'")
+    hotspots, weights = build_hotspots(templates, skew)
+
+    end = end or datetime.utcnow().replace(microsecond=0)
+    snapshot_count = max(1, int(days * snapshots_per_day))
+    step = timedelta(days=days) / snapshot_count
+    snapshot_times = [end - step * i for i in range(snapshot_count)]
+
+    snapshots = {i: [] for i in range(snapshot_count)}
+    assignments = rng.choices(range(snapshot_count), k=articles)
+    for n, snapshot_index in enumerate(assignments):
+        template = rng.choice(templates)
+        lat, lon = rng.choices(hotspots, weights=weights)[0]
+        # Il geocoder restituisce spesso lo stesso centroide per città e paesi
+        if rng.random() >= exact_share:
+            lat = max(-89.9, min(89.9, lat + rng.gauss(0, JITTER_DEGREES)))
+            lon = (lon + rng.gauss(0, JITTER_DEGREES) + 180) % 360 - 180
+        published = snapshot_times[snapshot_index] - timedelta(seconds=rng.uniform(0, MAX_PUBLISH_DELAY_HOURS * 3600))
+        snapshots[snapshot_index].append({
+            "lat": lat,
+            "lon": lon,
+            "title": f"{template.get('title', '')} #{n}",
+            "link": f"{template.get('link', 'https://example.com/')}#synthetic-{n}",
+            "source": template.get('source'),
+            "timestamp": published.strftime(TIMESTAMP_FORMAT),
+            "icon_url": template.get('icon_url'),
+            "description": template.get('description'),
+        })
+
+    data_dir = os.path.join(output_dir, "public", "data")
+    if os.path.isdir(data_dir):
+        shutil.rmtree(data_dir)
+    written = 0
+    for snapshot_index, news_items in snapshots.items():
+        if not news_items:
+            continue
+        snapshot_dir = os.path.join(data_dir, snapshot_times[snapshot_index].strftime(SNAPSHOT_DIR_FORMAT))
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with open(os.path.join(snapshot_dir, SNAPSHOT_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(news_items, f, indent=2, ensure_ascii=False)
+        written += 1
+
+    with open(os.path.join(output_dir, "dataset.json"), 'w', encoding='utf-8') as f:
+        json.dump({
+            "articles": articles, "days": days, "snapshots_per_day": snapshots_per_day, "skew": skew,
+            "exact_share": exact_share, "seed": seed, "end": end.strftime(TIMESTAMP_FORMAT),
+            "snapshots": written, "hotspots": len(hotspots),
+        }, f, indent=2)
+    print(f"Generate {articles} notizie in {written} snapshot ({days} giorni, {len(hotspots)} luoghi, skew {skew}) in '{data_dir}'.")
+    return written
+
+
+# --- BENCHMARK ---
+def time_step(function, repeat):
+    """Esegue function repeat volte e restituisce (durate in secondi, ultimo risultato)."""
+    durations, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def summarize(name, durations, **details):
+    return {"step": name, "best": min(durations), "median": statistics.median(durations), "runs": len(durations), **details}
+
+
+def bench_manifest(public_dir, repeat):
+    data_dir = os.path.join(public_dir, "data")
+    manifest_file = os.path.join(public_dir, "news_manifest.json")
+    durations, _ = time_step(lambda: update_manifest(data_dir, manifest_file), repeat)
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return summarize("update_manifest", durations, snapshots=len(os.listdir(data_dir)), entries=len(manifest))
+
+
+def bench_fanout(public_dir, repeat):
+    """Lettura e parsing di tutti i file del manifest: il lavoro che il frontend fa con una fetch per file."""
+    with open(os.path.join(public_dir, "news_manifest.json"), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    def load_all():
+        news = []
+        for news_file in manifest:
+            with open(os.path.join(public_dir, news_file), 'r', encoding='utf-8') as f:
+                news.extend(json.load(f))
+        return news
+
+    durations, news = time_step(load_all, repeat)
+    total_bytes = sum(os.path.getsize(os.path.join(public_dir, news_file)) for news_file in manifest)
+    return summarize("fan-out manifest", durations, requests=len(manifest), bytes=total_bytes, items=len(news)), news
+
+
+def bench_bundle(public_dir, news, now, repeat):
+    """Compattazione della finestra di 48 ore in un unico file JSON minificato."""
+    threshold = now - timedelta(hours=WINDOW_HOURS)
+    bundle_file = os.path.join(public_dir, "bundle_48h.json")
+
+    def write_bundle():
+        recent = [item for item in news if datetime.strptime(item['timestamp'], TIMESTAMP_FORMAT) > threshold]
+        with open(bundle_file, 'w', encoding='utf-8') as f:
+            json.dump(recent, f, ensure_ascii=False, separators=(',', ':'))
+        return len(recent)
+
+    durations, items = time_step(write_bundle, repeat)
+    return summarize("bundle 48h", durations, items=items, bytes=os.path.getsize(bundle_file))
+
+
+def bench_archive(public_dir, now, repeat):
+    """Import completo nell'archivio SQLite, aggiunta di uno snapshot e interrogazione della finestra."""
+    data_dir = os.path.join(public_dir, "data")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "archive.sqlite")
+
+        def full_import():
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            return import_snapshots(data_dir, db_path)
+
+        durations, imported = time_step(full_import, repeat)
+        results.append(summarize("archivio: import completo", durations, items=imported, bytes=os.path.getsize(db_path)))
+
+        latest = max(os.listdir(data_dir))
+        with open(os.path.join(data_dir, latest, SNAPSHOT_FILENAME), 'r', encoding='utf-8') as f:
+            latest_items = json.load(f)
+        durations, _ = time_step(lambda: archive_news(latest_items, latest, db_path), repeat)
+        results.append(summarize("archivio: snapshot singolo", durations, items=len(latest_items)))
+
+        conn = open_archive(db_path)
+        start = parse_timestamp((now - timedelta(hours=WINDOW_HOURS)).strftime(TIMESTAMP_FORMAT))
+
+        def query_window():
+            items, cursor, pages = [], None, 0
+            while True:
+                page, cursor = query_news(conn, start=start, limit=1000, cursor=cursor)
+                items.extend(page)
+                pages += 1
+                if not cursor:
+                    return len(items), pages
+
+        durations, (items, pages) = time_step(query_window, repeat)
+        results.append(summarize("archivio: finestra 48h", durations, items=items, pages=pages))
+        europe = (-10.0, 35.0, 30.0, 60.0)
+        durations, (page, _) = time_step(lambda: query_news(conn, bbox=europe, start=start, limit=1000), repeat)
+        results.append(summarize("archivio: bbox Europa 48h", durations, items=len(page)))
+        conn.close()
+    return results
+
+
+def bench_feed(public_dir, fanout_bytes):
+    """
+    Ripubblica in ordine tutti gli snapshot nel feed incrementale e confronta i byte
+    scaricati da un client che si aggiorna a ogni ciclo con il fan-out del manifest.
+    """
+    data_dir = os.path.join(public_dir, "data")
+    durations, delta_bytes = [], []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        feed_dir = os.path.join(tmp_dir, "feed")
+        for dirname in sorted(os.listdir(data_dir)):
+            with open(os.path.join(data_dir, dirname, SNAPSHOT_FILENAME), 'r', encoding='utf-8') as f:
+                news_items = json.load(f)
+            start = time.perf_counter()
+            state = publish_delta(news_items, dirname, feed_dir, now=datetime.strptime(dirname, SNAPSHOT_DIR_FORMAT))
+            durations.append(time.perf_counter() - start)
+            delta_file = os.path.join(feed_dir, "deltas", f"{state['seq']}.json")
+            if os.path.exists(delta_file):
+                delta_bytes.append(os.path.getsize(delta_file))
+
+        checkpoint_bytes = os.path.getsize(os.path.join(tmp_dir, state['checkpoint_file']))
+        items = len(load_current_items(feed_dir, load_state(feed_dir)))
+        poll_bytes = os.path.getsize(os.path.join(feed_dir, "state.json")) + statistics.median(delta_bytes or [0])
+    return summarize(
+        "feed: pubblicazione delta", durations, seq=state['seq'], items=items,
+        checkpoint_bytes=checkpoint_bytes, poll_bytes=int(poll_bytes), fanout_bytes=fanout_bytes,
+    )
+
+
+def bench_clustering(public_dir, now, repeat):
+    """Esegue filtro 48h e raggruppamento del frontend con node, senza browser."""
+    if not shutil.which("node"):
+        print("  ! 'node' non trovato: benchmark del raggruppamento saltato.")
+        return []
+    env = {**os.environ, "TZ": "UTC"}   # I timestamp delle notizie sono in UTC
+    try:
+        completed = subprocess.run(
+            ["node", "-e", NODE_HARNESS, os.path.abspath(FRONTEND_LAYOUT_FILE), os.path.abspath(public_dir),
+             str(calendar.timegm(now.timetuple()) * 1000),
+             str(repeat)],
+            capture_output=True, text=True, check=True, env=env
+        )
+        output = json.loads(completed.stdout)
+    except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+        print(f"  ! Benchmark del raggruppamento fallito: {e}")
+        return []
+    timings, counts = output["timings"], output["counts"]
+    return [
+        summarize("frontend: caricamento", [t / 1000 for t in timings["load"]], requests=counts["files"], items=counts["all"]),
+        summarize("frontend: filtro 48h", [t / 1000 for t in timings["filter"]], items=counts["recent"]),
+        summarize("frontend: raggruppamento", [t / 1000 for t in timings["cluster"]], markers=counts["markers"], groups=counts["groups"]),
+    ]
+
+
+def run_benchmarks(dataset_dir, repeat=3):
+    public_dir = os.path.join(dataset_dir, "public")
+    now = datetime.utcnow()
+    metadata_file = os.path.join(dataset_dir, "dataset.json")
+    if os.path.exists(metadata_file):
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            # La finestra di 48 ore è relativa alla fine del dataset, non all'ora attuale
+            now = datetime.strptime(json.load(f)["end"], TIMESTAMP_FORMAT)
+
+    results = [bench_manifest(public_dir, repeat)]
+    fanout, news = bench_fanout(public_dir, repeat)
+    results.append(fanout)
+    results.append(bench_bundle(public_dir, news, now, repeat))
+    results.extend(bench_archive(public_dir, now, repeat))
+    results.append(bench_feed(public_dir, fanout["bytes"]))
+    results.extend(bench_clustering(public_dir, now, repeat))
+    return results
+
+
+def print_results(results):
+    print(f"\n{'Passo':<28} {'Migliore':>10} {'Mediana':>10}  Dettagli")
+    print("-" * 80)
+    for result in results:
+        details = ", ".join(f"{k}={v}" for k, v in result.items() if k not in ("step", "best", "median", "runs"))
+        print(f"{result['step']:<28} {result['best'] * 1000:>8.1f}ms {result['median'] * 1000:>8.1f}ms  {details}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset sintetici e benchmark del percorso di pubblicazione e del frontend.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Genera cartelle di snapshot sintetiche")
+    generate_parser.add_argument("output_dir")
+    generate_parser.add_argument("--articles", type=int, default=10000)
+    generate_parser.add_argument("--days", type=float, default=30, help="Arco temporale coperto dagli snapshot")
+    generate_parser.add_argument("--snapshots-per-day", type=float, default=12, help="12 = un ciclo ogni 2 ore")
+    generate_parser.add_argument("--skew", type=float, default=1.0, help="Esponente Zipf sui luoghi (0 = uniforme)")
+    generate_parser.add_argument("--exact-share", type=float, default=0.7, help="Quota di notizie sul centroide esatto")
+    generate_parser.add_argument("--source", default=SOURCE_DATA_DIR, help="Corpus reale da usare come modello")
+    generate_parser.add_argument("--seed", type=int, default=42)
+
+    bench_parser = subparsers.add_parser("bench", help="Esegue i benchmark su un dataset generato")
+    bench_parser.add_argument("dataset_dir")
+    bench_parser.add_argument("--repeat", type=int, default=3)
+    bench_parser.add_argument("--json", dest="json_output", help="Salva i risultati in un file JSON")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate_dataset(args.output_dir, args.articles, args.days, args.snapshots_per_day,
+                         args.skew, args.exact_share, args.source, seed=args.seed)
+    elif args.command == "bench":
+        results = run_benchmarks(args.dataset_dir, args.repeat)
+        print_results(results)
+        if args.json_output:
+            with open(args.json_output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
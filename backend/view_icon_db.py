@@ -1,4 +1,5 @@
 import chromadb
+from icon_index import iter_collection
 
 DB_PATH = "icon_db"
 COLLECTION_NAME = "fluent_icons"
@@ -10,18 +11,17 @@ def view_db_content():
         
         print(f"Contenuto della collezione '{COLLECTION_NAME}' ({collection.count()} elementi):\n")
         
-        # Recupera tutti gli elementi (solo ID e documenti, non embeddings per leggibilità)
-        results = collection.get(ids=collection.get(include=[])['ids'], include=['documents'])
-        
-        if not results['ids']:
+        # Scorre la collezione a pagine (solo ID e documenti, non embeddings per leggibilità)
+        count = 0
+        for item in iter_collection(collection, include=("documents",)):
+            print(f"ID: {item['id']}, Document: {item['documents']}")
+            count += 1
+
+        if not count:
             print("La collezione è vuota.")
-            return
-            
-        for i in range(len(results['ids'])):
-            print(f"ID: {results['ids'][i]}, Document: {results['documents'][i]}")
             
     except Exception as e:
         print(f"Errore durante la lettura del database: {e}")
 
 if __name__ == "__main__":
-    view_db_content()
\ No newline at end of file
+    view_db_content()
@@ -0,0 +1,140 @@
+import json
+import time
+import sqlite3
+
+# --- CONFIGURAZIONE ---
+QUEUE_DB_FILE = "work_queue.sqlite"
+LEASE_SECONDS = 900     # Dopo questo tempo un batch non completato torna disponibile
+MAX_ATTEMPTS = 3        # Tentativi prima di considerare un articolo fallito
+
+# Stati di un articolo nella coda:
+# pending -> leased -> done -> published
+#               \-> (errore o lease scaduto) -> pending ... -> failed
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    link TEXT PRIMARY KEY,
+    source TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_status ON articles(status, lease_expires);
+"""
+
+
+def open_queue(path=QUEUE_DB_FILE):
+    """Apre (creandola se serve) la coda di lavoro su SQLite."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def enqueue_articles(conn, articles):
+    """Accoda gli articoli non ancora presenti (deduplicati per link). Restituisce quanti sono nuovi."""
+    now = time.time()
+    before = conn.total_changes
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "INSERT OR IGNORE INTO articles (link, source, payload, enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        [(a['link'], a['source'], json.dumps(a, ensure_ascii=False), now, now) for a in articles if a.get('link')]
+    )
+    conn.execute("COMMIT")
+    return conn.total_changes - before
+
+
+def claim_batch(conn, worker_id, batch_size, lease_seconds=LEASE_SECONDS):
+    """
+    Assegna al worker fino a batch_size articoli in attesa o con lease scaduto.
+    L'assegnazione è atomica: due worker non ricevono mai lo stesso articolo con lease valido.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # I lease scaduti oltre il numero massimo di tentativi vengono chiusi come falliti
+        conn.execute(
+            "UPDATE articles SET status = 'failed', error = 'Lease scaduto troppe volte', updated_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, MAX_ATTEMPTS)
+        )
+        rows = conn.execute(
+            "SELECT link, payload FROM articles "
+            "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+            "ORDER BY enqueued_at LIMIT ?",
+            (now, batch_size)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE articles SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+            "attempts = attempts + 1, updated_at = ? WHERE link = ?",
+            [(worker_id, now + lease_seconds, now, row['link']) for row in rows]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return [json.loads(row['payload']) for row in rows]
+
+
+def complete_article(conn, worker_id, link, result):
+    """
+    Registra il risultato di un articolo, solo se inviato dal worker che ne detiene il lease.
+    Un risultato tardivo (lease scaduto) è accettato finché l'articolo non è stato riassegnato
+    a un altro worker; articoli mai assegnati o di altri worker vengono rifiutati.
+    """
+    cursor = conn.execute(
+        "UPDATE articles SET status = 'done', result = ?, error = NULL, updated_at = ? "
+        "WHERE link = ? AND status = 'leased' AND lease_owner = ?",
+        (json.dumps(result, ensure_ascii=False), time.time(), link, worker_id)
+    )
+    return cursor.rowcount > 0
+
+
+def fail_article(conn, worker_id, link, error):
+    """Rimette in coda un articolo dopo un errore, o lo segna fallito dopo MAX_ATTEMPTS tentativi."""
+    cursor = conn.execute(
+        "UPDATE articles SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+        "WHERE link = ? AND status = 'leased' AND lease_owner = ?",
+        (MAX_ATTEMPTS, str(error), time.time(), link, worker_id)
+    )
+    return cursor.rowcount > 0
+
+
+def fetch_finished(conn):
+    """Restituisce gli articoli completati o falliti non ancora pubblicati."""
+    rows = conn.execute(
+        "SELECT link, payload, status, result, error FROM articles WHERE status IN ('done', 'failed') ORDER BY updated_at"
+    ).fetchall()
+    return [
+        {
+            "link": row['link'], "article": json.loads(row['payload']), "status": row['status'],
+            "result": json.loads(row['result']) if row['result'] else None, "error": row['error'],
+        }
+        for row in rows
+    ]
+
+
+def mark_published(conn, links):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "UPDATE articles SET status = 'published', updated_at = ? WHERE link = ?",
+        [(time.time(), link) for link in links]
+    )
+    conn.execute("COMMIT")
+
+
+def queue_stats(conn):
+    """Conteggio degli articoli per stato (i lease scaduti sono contati a parte)."""
+    now = time.time()
+    stats = {row['status']: row['n'] for row in conn.execute("SELECT status, COUNT(*) AS n FROM articles GROUP BY status")}
+    stats['expired_leases'] = conn.execute(
+        "SELECT COUNT(*) FROM articles WHERE status = 'leased' AND lease_expires < ?", (now,)
+    ).fetchone()[0]
+    return stats
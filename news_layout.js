@@ -0,0 +1,52 @@
+// Filtro temporale e raggruppamento dei marker, separati dal rendering del globo
+// così da poterli eseguire anche senza browser (backend/scale_benchmark.py)
+
+// Mantiene solo le notizie delle ultime `hours` ore
+const filterRecentNews = (allNews, hours = 48, now = Date.now()) => {
+    const threshold = new Date(now - hours * 60 * 60 * 1000);
+    return allNews.filter(news => new Date(news.timestamp) > threshold);
+};
+
+// Dispone in cerchio le notizie con coordinate quasi identiche
+const clusterNews = (recentNews) => {
+    const finalNewsData = [];
+    const pointGroups = {};
+    recentNews.forEach(d => {
+        // Riduci la precisione per raggruppare punti molto vicini
+        const key = `${d.lat.toFixed(3)},${d.lon.toFixed(3)}`;
+        if (!pointGroups[key]) pointGroups[key] = [];
+        pointGroups[key].push(d);
+    });
+
+    Object.values(pointGroups).forEach(group => {
+        if (group.length > 1) {
+            const n = group.length;
+            // Dimensione decrescente, con un minimo di 15px
+            const size = Math.max(15, 40 / Math.sqrt(n));
+            // Il raggio del cerchio in gradi di latitudine/longitudine, aumenta con il numero di icone
+            const radius = 0.15 * Math.log(n) + 0.05;
+
+            group.forEach((newsItem, index) => {
+                const angle = (index / n) * 2 * Math.PI;
+                // Calcola lo spostamento in gradi. La divisione per Math.cos(...) corregge la distorsione della longitudine vicino ai poli.
+                const lonOffset = radius * Math.cos(angle) / Math.cos(group[0].lat * Math.PI / 180);
+                const latOffset = radius * Math.sin(angle);
+
+                finalNewsData.push({
+                    ...newsItem,
+                    lat: group[0].lat + latOffset,
+                    lon: group[0].lon + lonOffset,
+                    size: size
+                });
+            });
+        } else {
+            // Notizia singola, usa dimensione di default
+            finalNewsData.push({ ...group[0], size: 40 });
+        }
+    });
+    return finalNewsData;
+};
+
+if (typeof module !== 'undefined') {
+    module.exports = { filterRecentNews, clusterNews };
+}
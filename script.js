@@ -9,8 +9,52 @@ const world = Globe()
 // URL delle risorse
 const COUNTRIES_URL = 'https://raw.githubusercontent.com/vasturiano/globe.gl/master/example/datasets/ne_110m_admin_0_countries.geojson';
 const MANIFEST_URL = 'https://raw.githubusercontent.com/bbnss/GloboNews/main/public/news_manifest.json';
+const ICON_ATLAS_URL = 'https://raw.githubusercontent.com/bbnss/GloboNews/main/public/icon_atlas.json';
+const GITHUB_RAW_URL_BASE = 'https://raw.githubusercontent.com/bbnss/GloboNews/main/public/';
+const FEED_STATE_URL = `${GITHUB_RAW_URL_BASE}feed/state.json`;
+const FEED_POLL_INTERVAL = 5 * 60 * 1000; // Intervallo di controllo del feed incrementale
+const FALLBACK_ICON_URL = 'https://raw.githubusercontent.com/microsoft/fluentui-emoji/main/assets/Newspaper/3D/newspaper_3d.png';
 
 let openCluster = null;
+let iconAtlas = null; // Mappa url icona -> posizione nello sprite atlas
+let feedCursor = null; // Ultimo seq del feed applicato
+let feedItems = new Map(); // id -> notizia, finestra corrente ricostruita dal feed
+
+// Disegna un'icona dallo sprite atlas alla dimensione richiesta; restituisce false se non è nell'atlas
+const applySprite = (el, iconUrl, size) => {
+    const position = iconAtlas && iconAtlas.icons[iconUrl];
+    if (!position) return false;
+    const scale = size / iconAtlas.cell;
+    el.style.width = `${size}px`;
+    el.style.height = `${size}px`;
+    el.style.backgroundImage = `url('${iconAtlas.imageUrl}')`;
+    el.style.backgroundSize = `${iconAtlas.width * scale}px ${iconAtlas.height * scale}px`;
+    el.style.backgroundPosition = `-${position[0] * scale}px -${position[1] * scale}px`;
+    return true;
+};
+
+// Crea l'elemento di un'icona: uno sprite se disponibile, altrimenti un'immagine singola
+const createIconElement = (iconUrl, size, className) => {
+    const sprite = document.createElement('span');
+    sprite.className = `${className} sprite-icon`;
+    if (applySprite(sprite, iconUrl, size)) {
+        sprite.dataset.iconUrl = iconUrl;
+        return sprite;
+    }
+    const img = document.createElement('img');
+    img.src = iconUrl || FALLBACK_ICON_URL;
+    img.className = className;
+    img.onerror = () => { img.onerror = null; img.src = FALLBACK_ICON_URL; }; // Fallback
+    return img;
+};
+
+// Ridimensiona un'icona (sprite o immagine)
+const resizeIcon = (icon, size) => {
+    if (!icon.dataset.iconUrl || !applySprite(icon, icon.dataset.iconUrl, size)) {
+        icon.style.width = `${size}px`;
+        icon.style.height = `${size}px`;
+    }
+};
 
 // Funzione per chiudere il cluster di icone aperto
 const closeOpenCluster = () => {
@@ -37,10 +81,7 @@ const populateTicker = (newsData) => {
             itemLink.target = '_blank';
             itemLink.className = 'ticker-item';
 
-            const icon = document.createElement('img');
-            icon.src = newsItem.icon_url;
-            icon.className = 'ticker-icon';
-            icon.onerror = () => { icon.src = 'https://raw.githubusercontent.com/microsoft/fluentui-emoji/main/assets/Newspaper/3D/newspaper_3d.png'; }; // Fallback
+            const icon = createIconElement(newsItem.icon_url, 20, 'ticker-icon');
 
             const title = document.createElement('span');
             title.textContent = newsItem.title;
@@ -57,120 +98,163 @@ const populateTicker = (newsData) => {
     }
 };
 
-// Funzione principale per caricare e processare i dati
-const loadAndProcessData = async () => {
+// Legge un file JSON, segnalando le risposte non valide
+const fetchJson = (url) => fetch(url).then(res => {
+    if (!res.ok) {
+        throw new Error(`Failed to fetch ${url}: ${res.statusText}`);
+    }
+    return res.json();
+});
+
+// Carica tutte le notizie dei file elencati nel manifest
+const loadManifestNews = async () => {
+    const manifest = await fetchJson(MANIFEST_URL);
+    const newsArrays = await Promise.all(manifest.map(newsFile => fetchJson(`${GITHUB_RAW_URL_BASE}${newsFile}`)));
+    return newsArrays.flat();
+};
+
+// Applica in ordine i delta del feed successivi a feedCursor, fino a toSeq
+const applyFeedDeltas = async (toSeq) => {
+    const seqs = [];
+    for (let seq = feedCursor + 1; seq <= toSeq; seq++) seqs.push(seq);
+    const deltas = await Promise.all(seqs.map(seq => fetchJson(`${GITHUB_RAW_URL_BASE}feed/deltas/${seq}.json`)));
+    deltas.forEach(delta => {
+        delta.removed.forEach(id => feedItems.delete(id));
+        delta.added.forEach(item => feedItems.set(item.id, item));
+    });
+    feedCursor = toSeq;
+};
+
+// Ricostruisce la finestra corrente dall'ultimo checkpoint e dai delta successivi
+const loadFeed = async (state) => {
+    const checkpoint = await fetchJson(`${GITHUB_RAW_URL_BASE}${state.checkpoint_file}`);
+    feedItems = new Map(checkpoint.items.map(item => [item.id, item]));
+    feedCursor = checkpoint.seq;
+    await applyFeedDeltas(state.seq);
+};
+
+// Scarica solo i delta nuovi e ridisegna il globo se qualcosa è cambiato
+const pollFeed = async () => {
     try {
-        const [countries, manifest] = await Promise.all([
-            fetch(COUNTRIES_URL).then(res => res.json()),
-            fetch(MANIFEST_URL).then(res => res.json())
-        ]);
+        const state = await fetchJson(FEED_STATE_URL);
+        if (feedCursor === null) {
+            // Il primo caricamento del feed non era riuscito: si riparte dal checkpoint
+            await loadFeed(state);
+        } else if (state.seq <= feedCursor) {
+            // Nessuna novità, oppure la CDN ha servito uno state.json più vecchio di quello già applicato
+            return;
+        } else if (feedCursor < state.oldest_delta - 1) {
+            // I delta mancanti sono già stati compattati: si riparte dal checkpoint
+            await loadFeed(state);
+        } else {
+            await applyFeedDeltas(state.seq);
+        }
+        renderNews([...feedItems.values()]);
+    } catch (error) {
+        console.error("Errore durante l'aggiornamento del feed:", error);
+    }
+};
 
-        const GITHUB_RAW_URL_BASE = 'https://raw.githubusercontent.com/bbnss/GloboNews/main/public/';
-        const newsPromises = manifest.map(newsFile => fetch(`${GITHUB_RAW_URL_BASE}${newsFile}`).then(res => {
-            if (!res.ok) {
-                throw new Error(`Failed to fetch ${newsFile}: ${res.statusText}`);
-            }
-            return res.json();
-        }));
-        const newsArrays = await Promise.all(newsPromises);
-        const allNews = newsArrays.flat();
+// Filtra, raggruppa e disegna le notizie sul globo e nel banner
+const renderNews = (allNews) => {
+    // Ordina tutte le notizie dalla più recente alla meno recente
+    const sortedNews = allNews.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
+    
+    // Prendi le ultime 100 notizie
+    const recentNews = sortedNews.slice(0, 100);
+    
+    console.log(`Trovate ${allNews.length} notizie totali, mostrando le ultime 100.`);
 
-        // Ordina tutte le notizie dalla più recente alla meno recente
-        const sortedNews = allNews.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-        
-        // Prendi le ultime 100 notizie
-        const recentNews = sortedNews.slice(0, 100);
-        
-        console.log(`Trovate ${allNews.length} notizie totali, mostrando le ultime 100.`);
+    populateTicker(recentNews);
 
-        populateTicker(recentNews);
+    const finalNewsData = clusterNews(recentNews);
 
-        const finalNewsData = [];
-        const pointGroups = {};
-        recentNews.forEach(d => {
-            // Riduci la precisione per raggruppare punti molto vicini
-            const key = `${d.lat.toFixed(3)},${d.lon.toFixed(3)}`;
-            if (!pointGroups[key]) pointGroups[key] = [];
-            pointGroups[key].push(d);
+    closeOpenCluster();
+    world.htmlElementsData(finalNewsData)
+        .htmlLat('lat')
+        .htmlLng('lon')
+        .htmlElement(d => {
+            const el = document.createElement('div');
+            const size = d.size || 40; // Usa la dimensione calcolata o un default
+
+            el.innerHTML = `
+                <div class="tooltip">
+                    <div class="tooltip-content">
+                        <b>${d.title}</b>
+                        <br>
+                        <i>Fonte: ${d.source}</i>
+                        <small> - ${new Date(d.timestamp).toLocaleString('it-IT')}</small>
+                    </div>
+                    ${d.description ? `<p class="tooltip-description">${d.description}</p>` : ''}
+                </div>
+            `;
+            
+            const icon = createIconElement(d.icon_url, size, 'globe-icon');
+            icon.dataset.baseSize = size;
+            resizeIcon(icon, size);
+            icon.style.filter = 'drop-shadow(0 0 3px white)';
+            icon.style.borderRadius = '50%';
+            el.prepend(icon);
+
+            el.style.pointerEvents = 'auto';
+            el.style.cursor = 'pointer';
+            el.onclick = () => window.open(d.link, '_blank');
+
+            const tooltip = el.querySelector('.tooltip');
+            el.onmouseover = () => {
+                el.style.zIndex = 100; // Porta l'elemento in primo piano
+                if (tooltip) {
+                    tooltip.style.zIndex = 999; // Assicura che il tooltip sia sopra tutto
+                    tooltip.style.visibility = 'visible';
+                    tooltip.style.opacity = 1;
+                }
+                world.controls().autoRotate = false;
+            };
+            el.onmouseout = () => {
+                el.style.zIndex = 1; // Reimposta l'ordine
+                if (tooltip) {
+                    tooltip.style.zIndex = 10; // Reimposta z-index originale
+                    tooltip.style.visibility = 'hidden';
+                    tooltip.style.opacity = 0;
+                }
+                world.controls().autoRotate = true;
+            };
+            return el;
         });
+};
 
-        Object.values(pointGroups).forEach(group => {
-            if (group.length > 1) {
-                const n = group.length;
-                // Dimensione decrescente, con un minimo di 15px
-                const size = Math.max(15, 40 / Math.sqrt(n));
-                // Il raggio del cerchio in gradi di latitudine/longitudine, aumenta con il numero di icone
-                const radius = 0.15 * Math.log(n) + 0.05;
-
-                group.forEach((newsItem, index) => {
-                    const angle = (index / n) * 2 * Math.PI;
-                    // Calcola lo spostamento in gradi. La divisione per Math.cos(...) corregge la distorsione della longitudine vicino ai poli.
-                    const lonOffset = radius * Math.cos(angle) / Math.cos(group[0].lat * Math.PI / 180);
-                    const latOffset = radius * Math.sin(angle);
-
-                    finalNewsData.push({
-                        ...newsItem,
-                        lat: group[0].lat + latOffset,
-                        lon: group[0].lon + lonOffset,
-                        size: size
-                    });
-                });
-            } else {
-                // Notizia singola, usa dimensione di default
-                finalNewsData.push({ ...group[0], size: 40 });
+// Funzione principale per caricare e processare i dati
+const loadAndProcessData = async () => {
+    try {
+        const [countries, atlas, feedState] = await Promise.all([
+            fetch(COUNTRIES_URL).then(res => res.json()),
+            // L'atlas è facoltativo: senza, ogni icona viene scaricata singolarmente
+            fetch(ICON_ATLAS_URL).then(res => res.ok ? res.json() : null).catch(() => null),
+            // Anche il feed è facoltativo: senza, si caricano tutti i file del manifest
+            fetchJson(FEED_STATE_URL).catch(() => null)
+        ]);
+        iconAtlas = atlas ? { ...atlas, imageUrl: new URL(atlas.image, ICON_ATLAS_URL).href } : null;
+
+        let allNews = null;
+        if (feedState) {
+            try {
+                await loadFeed(feedState);
+                allNews = [...feedItems.values()];
+            } catch (error) {
+                // pollFeed riprova a caricare il feed al prossimo controllo
+                feedCursor = null;
+                console.warn("Feed incrementale non disponibile, uso il manifest:", error);
             }
-        });
+            setInterval(pollFeed, FEED_POLL_INTERVAL);
+        }
+        if (!allNews) {
+            allNews = await loadManifestNews();
+        }
 
         world.polygonsData(countries.features)
             .polygonLabel(({ properties: d }) => `<b>${d.ADMIN}</b>`);
 
-        world.htmlElementsData(finalNewsData)
-            .htmlLat('lat')
-            .htmlLng('lon')
-            .htmlElement(d => {
-                const el = document.createElement('div');
-                const iconUrl = d.icon_url || './icons/news.svg';
-                const size = d.size || 40; // Usa la dimensione calcolata o un default
-
-                el.innerHTML = `
-                    <img src="${iconUrl}" width="${size}" height="${size}" class="globe-icon" data-base-size="${size}" style="filter: drop-shadow(0 0 3px white); border-radius: 50%;">
-                    <div class="tooltip">
-                        <div class="tooltip-content">
-                            <b>${d.title}</b>
-                            <br>
-                            <i>Fonte: ${d.source}</i>
-                            <small> - ${new Date(d.timestamp).toLocaleString('it-IT')}</small>
-                        </div>
-                        ${d.description ? `<p class="tooltip-description">${d.description}</p>` : ''}
-                    </div>
-                `;
-                
-                el.style.pointerEvents = 'auto';
-                el.style.cursor = 'pointer';
-                el.onclick = () => window.open(d.link, '_blank');
-
-                const tooltip = el.querySelector('.tooltip');
-                el.onmouseover = () => {
-                    el.style.zIndex = 100; // Porta l'elemento in primo piano
-                    if (tooltip) {
-                        tooltip.style.zIndex = 999; // Assicura che il tooltip sia sopra tutto
-                        tooltip.style.visibility = 'visible';
-                        tooltip.style.opacity = 1;
-                    }
-                    world.controls().autoRotate = false;
-                };
-                el.onmouseout = () => {
-                    el.style.zIndex = 1; // Reimposta l'ordine
-                    if (tooltip) {
-                        tooltip.style.zIndex = 10; // Reimposta z-index originale
-                        tooltip.style.visibility = 'hidden';
-                        tooltip.style.opacity = 0;
-                    }
-                    world.controls().autoRotate = true;
-                };
-                return el;
-            });
-
+        renderNews(allNews);
     } catch (error) {
         console.error("Errore durante il caricamento dei dati:", error);
         populateTicker(null);
@@ -200,8 +284,7 @@ const updateDynamicProperties = () => {
         document.querySelectorAll('.globe-icon').forEach(icon => {
             const baseSize = icon.getAttribute('data-base-size');
             if (icon.style.width !== `${baseSize}px`) {
-                icon.style.width = `${baseSize}px`;
-                icon.style.height = `${baseSize}px`;
+                resizeIcon(icon, baseSize);
             }
         });
     } else {
@@ -215,8 +298,7 @@ const updateDynamicProperties = () => {
         document.querySelectorAll('.globe-icon').forEach(icon => {
             const baseSize = parseFloat(icon.getAttribute('data-base-size'));
             const newSize = baseSize + (maxSize - baseSize) * zoomLevel;
-            icon.style.width = `${newSize}px`;
-            icon.style.height = `${newSize}px`;
+            resizeIcon(icon, newSize);
         });
 
         // 2. Interpola la velocità di rotazione